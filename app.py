@@ -1,6 +1,6 @@
 from flask import Flask
 from config import Config
-from extensions import db, bcrypt, login_manager, csrf
+from extensions import db, bcrypt, login_manager, csrf, post_like_state_cache, unread_count_cache, comment_tree_cache, taxonomy_cache, page_cache, like_buffer, notification_worker
 import os
 
 def create_app(config_class=Config):
@@ -12,6 +12,13 @@ def create_app(config_class=Config):
     bcrypt.init_app(app)
     login_manager.init_app(app)
     csrf.init_app(app)
+    post_like_state_cache.init_app(app)
+    unread_count_cache.init_app(app)
+    comment_tree_cache.init_app(app)
+    taxonomy_cache.init_app(app)
+    page_cache.init_app(app)
+    like_buffer.init_app(app)
+    notification_worker.init_app(app)
     
     # Create upload directory
     upload_dir = app.config['UPLOAD_FOLDER']
@@ -27,11 +34,12 @@ def create_app(config_class=Config):
     # Context processor for global template variables
     @app.context_processor
     def inject_categories():
-        from models import Category, Tag, UserRole
+        from models import UserRole, get_taxonomy
         from utils import time_ago, get_avatar_initials
+        taxonomy = get_taxonomy()
         return dict(
-            categories=Category.query.order_by(Category.name).all(),
-            tags=Tag.query.order_by(Tag.name).all(),
+            categories=taxonomy.categories,
+            tags=taxonomy.tags,
             time_ago=time_ago,
             get_avatar_initials=get_avatar_initials,
             UserRole=UserRole  # Make UserRole available in templates
@@ -120,7 +128,94 @@ def create_app(config_class=Config):
                 conn.commit()
                 print("Migration completed: user_id added to likes")
             
+            # Materialized path columns for nested comments
+            comments_columns = [col['name'] for col in inspector.get_columns('comments')]
+            if 'path' not in comments_columns:
+                print("Migrating: Adding path and depth columns to comments table...")
+                conn.execute(text("ALTER TABLE comments ADD COLUMN path TEXT"))
+                conn.execute(text("ALTER TABLE comments ADD COLUMN depth INTEGER DEFAULT 0 NOT NULL"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_comments_path ON comments (path)"))
+                conn.commit()
+                print("Migration completed: path and depth added to comments")
+            
+            # Denormalized like/comment/reply counters
+            counters_added = False
+            posts_columns = [col['name'] for col in inspector.get_columns('posts')]
+            if 'likes_count' not in posts_columns:
+                print("Migrating: Adding counter columns to posts table...")
+                conn.execute(text("ALTER TABLE posts ADD COLUMN likes_count INTEGER DEFAULT 0 NOT NULL"))
+                conn.execute(text("ALTER TABLE posts ADD COLUMN comments_count INTEGER DEFAULT 0 NOT NULL"))
+                conn.commit()
+                counters_added = True
+                print("Migration completed: counter columns added to posts")
+            
+            if 'comment_version' not in posts_columns:
+                print("Migrating: Adding comment_version column to posts table...")
+                conn.execute(text("ALTER TABLE posts ADD COLUMN comment_version INTEGER DEFAULT 0 NOT NULL"))
+                conn.commit()
+                print("Migration completed: comment_version added to posts")
+            
+            # Stored excerpt/word count/reading time for listings
+            text_stats_added = False
+            if 'excerpt' not in posts_columns:
+                print("Migrating: Adding excerpt, word_count and reading_time columns to posts table...")
+                conn.execute(text("ALTER TABLE posts ADD COLUMN excerpt TEXT"))
+                conn.execute(text("ALTER TABLE posts ADD COLUMN word_count INTEGER DEFAULT 0 NOT NULL"))
+                conn.execute(text("ALTER TABLE posts ADD COLUMN reading_time INTEGER DEFAULT 1 NOT NULL"))
+                conn.commit()
+                text_stats_added = True
+                print("Migration completed: text stat columns added to posts")
+            
+            if 'likes_count' not in comments_columns:
+                print("Migrating: Adding counter columns to comments table...")
+                conn.execute(text("ALTER TABLE comments ADD COLUMN likes_count INTEGER DEFAULT 0 NOT NULL"))
+                conn.execute(text("ALTER TABLE comments ADD COLUMN replies_count INTEGER DEFAULT 0 NOT NULL"))
+                conn.commit()
+                counters_added = True
+                print("Migration completed: counter columns added to comments")
+            
+            # Published post totals per category/tag for listing pagination
+            for table in ('categories', 'tags'):
+                if 'post_count' not in [col['name'] for col in inspector.get_columns(table)]:
+                    print(f"Migrating: Adding post_count column to {table} table...")
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN post_count INTEGER DEFAULT 0 NOT NULL"))
+                    conn.commit()
+                    counters_added = True
+                    print(f"Migration completed: post_count added to {table}")
+            
             conn.close()
+            
+            # Secondary indexes declared on the models; create_all() skips
+            # tables that already exist, so add any that are missing
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=db.engine, checkfirst=True)
+            
+            if text_stats_added:
+                from models import Post
+                print("Migrating: Computing post excerpts and reading times...")
+                updated = Post.backfill_text_stats()
+                print(f"Migration completed: {updated} posts updated")
+            
+            if counters_added:
+                from models import recount_counters
+                print("Migrating: Populating like/comment/reply and post counters...")
+                fixed = recount_counters()
+                print(f"Migration completed: {fixed} rows recounted")
+            
+            # Backfill paths for comments created before the column existed
+            from models import Comment
+            if db.session.query(Comment.id).filter(Comment.path.is_(None)).first():
+                print("Migrating: Backfilling comment paths...")
+                updated = Comment.rebuild_paths()
+                print(f"Migration completed: {updated} comment paths rebuilt")
+            
+            # Full-text search index (SQLite FTS5), built once on first run
+            from search import search_available, rebuild_search_index
+            if search_available() and 'posts_fts' not in tables:
+                print("Migrating: Building full-text search index...")
+                indexed = rebuild_search_index()
+                print(f"Migration completed: {indexed} posts indexed for search")
         except Exception as e:
             print(f"Migration check completed (or skipped): {e}")
         
@@ -138,6 +233,10 @@ def create_app(config_class=Config):
             db.session.commit()
             print(f"Default admin created: {app.config['ADMIN_USERNAME']}")
     
+    # In-memory prefix index for search suggestions, built on first use
+    from search import suggestions
+    suggestions.init_app(app)
+    
     # Error handlers
     @app.errorhandler(403)
     def forbidden_error(error):
@@ -0,0 +1,31 @@
+"""
+Maintenance script to recompute the stored post excerpts, word counts and
+reading times from each post's content. The admin routes keep them current;
+run this after editing post content directly in the database (safe to re-run):
+    python backfill_post_excerpts.py
+"""
+
+import os
+import sys
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import Post
+
+# Create the app (adds the excerpt columns if they are missing)
+app = create_app()
+
+
+def backfill_excerpts():
+    """Recompute excerpt, word_count and reading_time for every post."""
+    with app.app_context():
+        updated = Post.backfill_text_stats()
+        print(f"Updated text stats for {updated} posts")
+
+
+if __name__ == '__main__':
+    print("=== Starting Post Excerpt Backfill ===\n")
+    backfill_excerpts()
+    print("\n=== Backfill completed! ===")
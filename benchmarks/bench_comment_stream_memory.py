@@ -0,0 +1,107 @@
+"""
+Peak memory of GET /api/post/<id>/comments on a very large thread, buffered
+versus streamed (?stream=1).
+
+Seeds one post with a random 50,000-comment tree (about 80% replies, up to
+a few hundred levels deep) and measures the peak Python allocation of each
+request with tracemalloc, reading the whole body, then checks that both
+modes return the same document:
+    python benchmarks/bench_comment_stream_memory.py
+    python benchmarks/bench_comment_stream_memory.py --comments 10000
+"""
+
+import argparse
+import json
+import random
+from collections import Counter
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from common import create_benchmark_app, make_post, make_users
+from extensions import db, comment_tree_cache
+
+
+def seed_thread(post_id, user_ids, count, seed=3):
+    """Add count comments to the post; each replies to one of the 50 before it"""
+    from models import Comment, Post
+
+    start = datetime(2024, 1, 1)
+    db.session.execute(
+        db.insert(Comment),
+        [
+            {
+                "post_id": post_id,
+                "user_id": user_ids[i % len(user_ids)],
+                "comment": "lorem ipsum dolor sit amet " * 3,
+                "created_at": start + timedelta(milliseconds=i),
+            }
+            for i in range(count)
+        ],
+    )
+    ids = [
+        comment_id
+        for (comment_id,) in db.session.query(Comment.id)
+        .filter_by(post_id=post_id)
+        .order_by(Comment.id)
+    ]
+    rnd = random.Random(seed)
+    replies = [
+        {"id": comment_id, "parent_comment_id": ids[rnd.randrange(max(0, i - 50), i)]}
+        for i, comment_id in enumerate(ids)
+        if i and rnd.random() < 0.8
+    ]
+    db.session.execute(db.update(Comment), replies)
+    # Set the counters here rather than recounting every post on the site
+    reply_counts = Counter(reply["parent_comment_id"] for reply in replies)
+    db.session.execute(
+        db.update(Comment),
+        [{"id": parent_id, "replies_count": n} for parent_id, n in reply_counts.items()],
+    )
+    db.session.execute(
+        db.update(Post).where(Post.id == post_id).values(comments_count=count)
+    )
+    db.session.commit()
+    Comment.rebuild_paths()
+
+
+def measure(client, url):
+    """Peak traced allocation (bytes), body size and seconds of one request"""
+    comment_tree_cache.clear()
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(url, buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    response.close()
+    return peak, size, elapsed
+
+
+def run(count):
+    app = create_benchmark_app()
+    with app.app_context():
+        user_ids = make_users(5)
+        post_id = make_post("Viral post")
+        print(f"Seeding {count} comments...")
+        seed_thread(post_id, user_ids, count)
+
+    client = app.test_client()
+    url = f"/api/post/{post_id}/comments?max_depth=1000"
+    results = {}
+    for mode, query in (("buffered", ""), ("streamed", "&stream=1")):
+        peak, size, elapsed = measure(client, url + query)
+        results[mode] = peak
+        print(f"{mode:>9}: peak {peak / 1e6:6.1f} MB, body {size / 1e6:.1f} MB, {elapsed:.1f}s")
+    print(f"Streaming peak is {results['streamed'] / results['buffered']:.0%} of buffered")
+
+    comment_tree_cache.clear()
+    same = json.loads(client.get(url).data) == json.loads(client.get(url + "&stream=1").data)
+    print(f"Same JSON from both modes: {same}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--comments", type=int, default=50000)
+    run(parser.parse_args().comments)
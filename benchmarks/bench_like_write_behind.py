@@ -0,0 +1,87 @@
+"""
+Throughput of POST /post/<id>/like, synchronous versus write-behind
+(LIKE_WRITE_BEHIND).
+
+200 users click like 7 times each on one post (1400 clicks), spread over
+8 threads. For each mode it reports clicks per second and the write
+transactions committed, then checks that the stored counter matches the
+likes table once everything is flushed:
+    python benchmarks/bench_like_write_behind.py
+    python benchmarks/bench_like_write_behind.py --users 50 --clicks 5
+"""
+
+import argparse
+import threading
+import time
+
+from sqlalchemy import event
+
+from common import create_benchmark_app, login, make_post, make_users
+from extensions import db, like_buffer
+
+THREADS = 8
+
+
+def click(app, url, user_ids, clicks, statuses):
+    for user_id in user_ids:
+        client = app.test_client()
+        login(client, user_id)
+        for _ in range(clicks):
+            statuses.append(client.post(url).status_code)
+
+
+def run_mode(write_behind, users, clicks):
+    from models import Like, Post
+
+    app = create_benchmark_app(
+        LIKE_WRITE_BEHIND=write_behind, LIKE_FLUSH_INTERVAL=0.5
+    )
+    with app.app_context():
+        user_ids = make_users(users)
+        post_id = make_post("Viral post")
+        engine = db.engine
+
+    commits = []
+
+    def listener(connection):
+        commits.append(connection)
+
+    event.listen(engine, "commit", listener)
+    statuses = []
+    threads = [
+        threading.Thread(
+            target=click,
+            args=(app, f"/post/{post_id}/like", user_ids[i::THREADS], clicks, statuses),
+        )
+        for i in range(THREADS)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    like_buffer.flush()
+    event.remove(engine, "commit", listener)
+
+    with app.app_context():
+        stored = db.session.get(Post, post_id).likes_count
+        rows = Like.query.filter_by(post_id=post_id).count()
+    expected = users if clicks % 2 else 0
+    name = "write-behind" if write_behind else "synchronous"
+    print(
+        f"{name:>12}: {len(statuses)} clicks in {elapsed:.2f}s = {len(statuses) / elapsed:.0f}/s, "
+        f"{len(commits)} write transactions, "
+        f"errors {len(statuses) - statuses.count(200)}, "
+        f"likes_count {stored}, rows {rows}, expected {expected}"
+    )
+    like_buffer.enabled = False
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--clicks", type=int, default=7)
+    args = parser.parse_args()
+    for write_behind in (False, True):
+        run_mode(write_behind, args.users, args.clicks)
@@ -0,0 +1,102 @@
+"""
+Search-as-you-type suggestion index over 100,000 published post titles.
+
+Seeds the titles (five random words each), builds the index the way a
+worker does on its first suggest request, then times lookups for a few
+prefixes (best and median of a few rounds) and a refresh that applies
+logged changes incrementally:
+    python benchmarks/bench_suggest.py
+    python benchmarks/bench_suggest.py --titles 20000
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from common import create_benchmark_app
+from extensions import db
+
+WORDS = [
+    "flask", "sqlite", "python", "cache", "index", "tuning",
+    "guide", "async", "query", "speed", "blog", "notes",
+]
+PREFIXES = ["f", "sq", "tuning gu", "zz", "4242"]
+LOOKUPS = 2000
+ROUNDS = 5
+UPDATES = 200
+
+
+def seed_titles(count, seed=1):
+    from models import Post
+
+    rnd = random.Random(seed)
+    db.session.execute(
+        db.insert(Post),
+        [
+            {
+                "title": " ".join(rnd.choice(WORDS) for _ in range(5)) + f" {i}",
+                "slug": f"post-{i}",
+                "content": "<p>x</p>",
+                "is_published": True,
+            }
+            for i in range(count)
+        ],
+    )
+    db.session.commit()
+
+
+def run(count):
+    from models import SuggestionChange
+    from search import SuggestionIndex
+
+    app = create_benchmark_app()
+    with app.app_context():
+        print(f"Seeding {count} titles...")
+        seed_titles(count)
+
+        index = SuggestionIndex()
+        started = time.perf_counter()
+        index.load()
+        elapsed = time.perf_counter() - started
+    print(f"Build: {len(index)} items, {len(index._entries)} keys in {elapsed:.2f}s")
+
+    for prefix in PREFIXES:
+        rounds = []
+        for _ in range(ROUNDS):
+            started = time.perf_counter()
+            for _ in range(LOOKUPS):
+                found = index.suggest(prefix)
+            rounds.append((time.perf_counter() - started) / LOOKUPS)
+        print(
+            f"Lookup {prefix!r:>12}: {len(found)} results, "
+            f"best {min(rounds) * 1e6:.1f}us, median {statistics.median(rounds) * 1e6:.1f}us"
+        )
+
+    with app.app_context():
+        # What other workers' admin requests leave in the change log
+        db.session.execute(
+            db.insert(SuggestionChange),
+            [
+                {"kind": "post", "item_id": count + i, "label": f"Brand new flask post {i}", "slug": f"new-{i}"}
+                for i in range(UPDATES)
+            ]
+            + [{"kind": "post", "item_id": i, "label": None} for i in range(UPDATES)],
+        )
+        db.session.commit()
+
+        loads = index.loads
+        started = time.perf_counter()
+        index.refresh()
+        elapsed = time.perf_counter() - started
+    assert index.loads == loads
+    print(
+        f"Refresh: {index.changes_applied} logged changes in {elapsed * 1e3:.1f}ms "
+        f"({elapsed / index.changes_applied * 1e3:.2f}ms each), no rebuild"
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--titles", type=int, default=100000)
+    run(parser.parse_args().titles)
@@ -0,0 +1,79 @@
+"""
+Shared setup for the benchmark scripts: an app on a throwaway SQLite
+database and helpers to seed it. Nothing here touches blog.db.
+"""
+
+import os
+import sys
+import tempfile
+
+# Add the repository root to the path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import Config
+from extensions import db
+
+
+def create_benchmark_app(**settings):
+    """An app on a fresh SQLite file in a temporary directory"""
+    directory = tempfile.mkdtemp(prefix="blog-benchmark-")
+
+    class BenchmarkConfig(Config):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(directory, 'benchmark.db')}"
+        UPLOAD_FOLDER = os.path.join(directory, "uploads")
+        PAGE_CACHE_TTL = 0
+        NOTIFICATION_WORKER = False
+
+    for name, value in settings.items():
+        setattr(BenchmarkConfig, name, value)
+    return create_app(BenchmarkConfig)
+
+
+def make_users(count, prefix="user"):
+    """Insert count users in one statement and return their ids"""
+    from models import User
+
+    db.session.execute(
+        db.insert(User),
+        [
+            {
+                "username": f"{prefix}{i}",
+                "email": f"{prefix}{i}@example.com",
+                "password_hash": "x",
+                "full_name": f"User {i}",
+            }
+            for i in range(count)
+        ],
+    )
+    db.session.commit()
+    return [
+        user_id
+        for (user_id,) in db.session.query(User.id)
+        .filter(User.username.like(f"{prefix}%"))
+        .order_by(User.id)
+    ]
+
+
+def make_post(title="Benchmark post"):
+    from models import Post
+
+    post = Post(
+        title=title,
+        slug=title.lower().replace(" ", "-"),
+        content=f"<p>{title}</p>",
+        is_published=True,
+    )
+    db.session.add(post)
+    db.session.commit()
+    return post.id
+
+
+def login(client, user_id):
+    """Sign a test client in as the given user"""
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+        session["user_type"] = "user"
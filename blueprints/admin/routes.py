@@ -1,11 +1,12 @@
 from flask import render_template, redirect, url_for, flash, request, jsonify, current_app, abort
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
-from extensions import db
-from models import User, Post, Category, Tag, Comment, Like, PostMedia, UserRole
+from extensions import db, post_like_state_cache, unread_count_cache, comment_tree_cache, taxonomy_cache, page_cache, like_buffer, notification_worker
+from models import User, Post, Category, Tag, Comment, Like, PostMedia, UserRole, touch_taxonomy
 from . import admin_bp
 from .forms import PostForm, CategoryForm, TagForm
-from utils import allowed_file, sanitize_html, is_image_file, is_video_file
+from search import index_post, remove_post, suggestions, touch_suggestions, touch_post_suggestion
+from utils import allowed_file, sanitize_html, is_image_file, is_video_file, remove_files_in_background
 from datetime import datetime
 import os
 
@@ -100,7 +101,8 @@ def dashboard():
 @login_required
 def posts():
     page = request.args.get('page', 1, type=int)
-    posts = Post.query.order_by(Post.created_at.desc()).paginate(
+    query = Post.listing_query(published_only=False, with_media=False)
+    posts = query.order_by(Post.created_at.desc()).paginate(
         page=page, per_page=10, error_out=False)
     return render_template('admin/posts.html', posts=posts)
 
@@ -133,6 +135,7 @@ def create_post():
             category_id=form.category.data if form.category.data else None,
             is_published=form.is_published.data
         )
+        post.refresh_text_stats()
         
         # Handle multiple media files
         files = request.files.getlist('media_files')
@@ -163,6 +166,11 @@ def create_post():
             post.tags = selected_tags
         
         db.session.add(post)
+        index_post(post)
+        Post.adjust_listing_counts(set(), post.listing_keys())
+        post.invalidate_pages()
+        if post.is_published:
+            touch_post_suggestion(post)
         db.session.commit()
         flash('Post created successfully!', 'success')
         return redirect(url_for('admin.posts'))
@@ -176,9 +184,12 @@ def edit_post(post_id):
     form = PostForm(obj=post)
     
     if form.validate_on_submit():
+        listed_before = post.listing_keys()
+        suggested_before = (post.title, post.is_published)
         post.title = form.title.data
         post.slug = generate_unique_slug(form.title.data, post_id=post.id)
         post.content = sanitize_html(form.content.data)
+        post.refresh_text_stats()
         post.category_id = form.category.data if form.category.data else None
         post.is_published = form.is_published.data
         post.updated_at = datetime.utcnow()
@@ -230,6 +241,11 @@ def edit_post(post_id):
         else:
             post.tags = []
         
+        index_post(post)
+        Post.adjust_listing_counts(listed_before, post.listing_keys())
+        post.invalidate_pages(listed_before)
+        if (post.title, post.is_published) != suggested_before:
+            touch_post_suggestion(post)
         db.session.commit()
         flash('Post updated successfully!', 'success')
         return redirect(url_for('admin.posts'))
@@ -257,6 +273,11 @@ def delete_post(post_id):
         if os.path.exists(file_path):
             os.remove(file_path)
     
+    remove_post(post.id)
+    Post.adjust_listing_counts(post.listing_keys(), set())
+    post.invalidate_pages()
+    if post.is_published:
+        touch_suggestions('post', post.id)
     db.session.delete(post)
     db.session.commit()
     flash('Post deleted successfully!', 'success')
@@ -266,7 +287,12 @@ def delete_post(post_id):
 @login_required
 def toggle_post(post_id):
     post = Post.query.get_or_404(post_id)
+    listed_before = post.listing_keys()
     post.is_published = not post.is_published
+    index_post(post)
+    Post.adjust_listing_counts(listed_before, post.listing_keys())
+    post.invalidate_pages(listed_before)
+    touch_post_suggestion(post)
     db.session.commit()
     status = 'published' if post.is_published else 'unpublished'
     flash(f'Post {status} successfully!', 'success')
@@ -279,6 +305,9 @@ def categories():
     if form.validate_on_submit():
         category = Category(name=form.name.data)
         db.session.add(category)
+        touch_taxonomy()
+        db.session.flush()
+        touch_suggestions('category', category.id, category.name)
         db.session.commit()
         flash('Category added successfully!', 'success')
         return redirect(url_for('admin.categories'))
@@ -290,7 +319,14 @@ def categories():
 @login_required
 def delete_category(category_id):
     category = Category.query.get_or_404(category_id)
+    # Posts are deleted along with their category
+    for post in category.posts:
+        remove_post(post.id)
+        Post.adjust_listing_counts(post.listing_keys(), set())
+        touch_suggestions('post', post.id)
+    touch_suggestions('category', category.id)
     db.session.delete(category)
+    touch_taxonomy()
     db.session.commit()
     flash('Category deleted successfully!', 'success')
     return redirect(url_for('admin.categories'))
@@ -302,6 +338,9 @@ def tags():
     if form.validate_on_submit():
         tag = Tag(name=form.name.data)
         db.session.add(tag)
+        touch_taxonomy()
+        db.session.flush()
+        touch_suggestions('tag', tag.id, tag.name)
         db.session.commit()
         flash('Tag added successfully!', 'success')
         return redirect(url_for('admin.tags'))
@@ -313,7 +352,15 @@ def tags():
 @login_required
 def delete_tag(tag_id):
     tag = Tag.query.get_or_404(tag_id)
+    tagged_posts = tag.posts.filter_by(is_published=True).all()
     db.session.delete(tag)
+    touch_taxonomy()
+    touch_suggestions('tag', tag_id)
+    db.session.flush()
+    # Re-index the posts that carried the tag so it stops matching
+    for post in tagged_posts:
+        db.session.expire(post, ['tags'])
+        index_post(post)
     db.session.commit()
     flash('Tag deleted successfully!', 'success')
     return redirect(url_for('admin.tags'))
@@ -330,9 +377,18 @@ def comments():
 @login_required
 def delete_comment(comment_id):
     comment = Comment.query.get_or_404(comment_id)
-    db.session.delete(comment)
+    
+    # Delete the comment, its replies, their likes and notifications in bulk
+    deleted_count, images = comment.delete_subtree()
     db.session.commit()
-    flash('Comment deleted successfully!', 'success')
+    
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    remove_files_in_background([os.path.join(upload_folder, image) for image in images])
+    
+    if deleted_count > 1:
+        flash(f'Comment and {deleted_count - 1} replies deleted successfully!', 'success')
+    else:
+        flash('Comment deleted successfully!', 'success')
     return redirect(url_for('admin.comments'))
 
 
@@ -351,6 +407,7 @@ def delete_media(media_id):
         os.remove(file_path)
     
     # Delete from database
+    media.post.invalidate_pages()
     db.session.delete(media)
     db.session.commit()
     
@@ -387,6 +444,7 @@ def reorder_media(post_id):
         if media:
             media.order_index = index
     
+    post.invalidate_pages()
     db.session.commit()
     
     return jsonify({
@@ -419,3 +477,33 @@ def get_post_media(post_id):
     })
 
 
+# ============== Cache Monitoring API Endpoints ==============
+
+@admin_bp.route('/api/cache/stats', methods=['GET'])
+@login_required
+def cache_stats():
+    """Hit/miss counters of the in-process caches of this worker."""
+    return jsonify({
+        'success': True,
+        'caches': {
+            'post_like_state': post_like_state_cache.stats(),
+            'unread_count': unread_count_cache.stats(),
+            'comment_tree': comment_tree_cache.stats(),
+            'taxonomy': taxonomy_cache.stats(),
+            'suggestions': suggestions.stats(),
+            'pages': page_cache.stats()
+        },
+        'like_buffer': like_buffer.stats()
+    })
+
+
+# ============== Notification Monitoring API Endpoints ==============
+
+@admin_bp.route('/api/notifications/metrics', methods=['GET'])
+@login_required
+def notification_metrics():
+    """Depth and lag of the notification outbox, and this worker's delivery counters."""
+    return jsonify({
+        'success': True,
+        'notifications': notification_worker.metrics()
+    })
@@ -1,72 +1,214 @@
-from flask import render_template, request, jsonify, flash, session, redirect, url_for, current_app
+from flask import render_template, request, jsonify, flash, session, redirect, url_for, current_app, abort
 from flask_login import login_user, logout_user, login_required, current_user
-from extensions import db
-from models import Post, Category, Tag, Comment, Like, CommentLike, User, UserRole
-from utils import sanitize_html, get_user_identifier
+from extensions import db, comment_tree_cache, page_cache, like_buffer
+from models import Post, Category, Tag, Comment, Like, CommentLike, User, UserRole, SiteCounter, Notification, NotificationEvent, NotificationType
+from utils import (
+    sanitize_html, get_user_identifier, encode_cursor, decode_cursor,
+    make_etag, not_modified, with_etag, conditional_page, remove_files_in_background
+)
 from datetime import datetime
-from sqlalchemy import or_, func
+from sqlalchemy import func
+from pagination import KeysetPagination
+from search import (
+    search_posts, search_page, highlight_snippet,
+    encode_search_cursor, decode_search_cursor, get_suggestions,
+)
 from .forms import CommentForm, LoginForm, SignupForm
 from . import public_bp
 from werkzeug.utils import secure_filename
+import json
 import os
 import uuid
 
 
+def listing_dependencies():
+    """Page cache dependencies of the index listing for the current filters"""
+    category_id = request.args.get("category", type=int)
+    tag_id = request.args.get("tag", type=int)
+    # The sidebar shows post counts per category
+    names = ["taxonomy", "taxonomy:counts"]
+    if category_id:
+        names.append(f"listing:category:{category_id}")
+    if tag_id:
+        names.append(f"listing:tag:{tag_id}")
+    if not (category_id or tag_id):
+        names.append("listing:all")
+    return names
+
+
+def post_dependencies(slug):
+    """Page cache dependencies of a post page, including its related posts"""
+    post = db.session.query(Post.id, Post.category_id).filter_by(slug=slug).first()
+    if post is None:
+        return ["taxonomy"]
+    names = ["taxonomy", f"post:{post.id}"]
+    if post.category_id:
+        names.append(f"listing:category:{post.category_id}")
+    return names
+
+
+def taxonomy_version(name=SiteCounter.TAXONOMY_VERSION):
+    """
+    Scalar subquery of a taxonomy version: the category/tag names of the
+    menus by default, or TAXONOMY_COUNTS_VERSION for the sidebar counts.
+    """
+    return (
+        db.select(SiteCounter.value)
+        .where(SiteCounter.name == name)
+        .scalar_subquery()
+    )
+
+
+def listing_validators(total, *criteria, with_counts=False):
+    """
+    HTTP validators of a post listing page, from the rows on the page only:
+    the same keyset/offset page the view reads, narrowed to the id, edit
+    time and counters of each card, the stored total and the taxonomy
+    version, plus the taxonomy counts version if with_counts (the index
+    sidebar). Cheap however large the archive is.
+    """
+    page = listing_page(
+        db.session.query(
+            Post.id, Post.created_at, Post.updated_at, Post.likes_count, Post.comments_count
+        ).filter(Post.is_published.is_(True), *criteria),
+        request.args.get("page", 1, type=int),
+        total,
+    )
+    versions = [taxonomy_version()]
+    if with_counts:
+        versions.append(taxonomy_version(SiteCounter.TAXONOMY_COUNTS_VERSION))
+    return (
+        page.total,
+        page.has_next,
+        *(tuple(row) for row in page.items),
+        *db.session.query(*versions).one(),
+    )
+
+
+def index_validators():
+    # Search results are ranked over every matching post: no validators
+    if request.args.get("search"):
+        return None
+    criteria = []
+    category_id = request.args.get("category", type=int)
+    tag_id = request.args.get("tag", type=int)
+    if category_id:
+        criteria.append(Post.category_id == category_id)
+    if tag_id:
+        criteria.append(Post.has_tag(tag_id))
+    return listing_validators(
+        Post.listing_total(category_id, tag_id), *criteria, with_counts=True
+    )
+
+
+def related_posts_query(post_id, category_id):
+    """The newest other published posts in a post's category"""
+    return (
+        Post.query.filter(
+            Post.category_id == category_id,
+            Post.is_published.is_(True),
+            Post.id != post_id,
+        )
+        .order_by(Post.created_at.desc(), Post.id.desc())
+        .limit(3)
+    )
+
+
+def post_validators(slug):
+    """
+    HTTP validators of a post page: the post's own edits, comment activity
+    (comment_version moves on every comment change and comment like) and
+    likes, the related posts it shows and the taxonomy version. None for
+    unknown slugs, so the view answers 404.
+    """
+    row = (
+        db.session.query(
+            Post.id,
+            Post.category_id,
+            Post.updated_at,
+            Post.comment_version,
+            Post.likes_count,
+            taxonomy_version(),
+        )
+        .filter(Post.slug == slug, Post.is_published.is_(True))
+        .first()
+    )
+    if row is None:
+        return None
+    related = []
+    if row.category_id:
+        related = related_posts_query(row.id, row.category_id).with_entities(
+            Post.id, Post.updated_at
+        ).all()
+    # Likes buffered by this worker and not yet written
+    return (*row, *(tuple(post) for post in related), like_buffer.pending_delta(row.id))
+
+
 @public_bp.route("/")
+@page_cache.cached(listing_dependencies)
+@conditional_page(index_validators)
 def index():
     page = request.args.get("page", 1, type=int)
     category_id = request.args.get("category", type=int)
     tag_id = request.args.get("tag", type=int)
     search = request.args.get("search", "", type=str)
 
-    query = Post.query.filter_by(is_published=True)
+    query = Post.listing_query()
 
     if category_id:
         query = query.filter_by(category_id=category_id)
 
     if tag_id:
-        query = query.filter(Post.tags.any(Tag.id == tag_id))
+        query = query.filter(Post.has_tag(tag_id))
 
+    snippets = {}
     if search:
-        query = query.filter(
-            or_(Post.title.ilike(f"%{search}%"), Post.content.ilike(f"%{search}%"))
-        )
-
-    posts = query.order_by(Post.created_at.desc()).paginate(
-        page=page, per_page=6, error_out=False
-    )
-
-    categories = Category.query.all()
-    tags = Tag.query.all()
+        # Ranked by relevance (bm25) rather than date; rows are (post, snippet)
+        posts = search_posts(query, search).paginate(page=page, per_page=6, error_out=False)
+        snippets = {post.id: highlight_snippet(snippet) for post, snippet in posts.items}
+        posts.items = [post for post, _ in posts.items]
+    else:
+        posts = listing_page(query, page, Post.listing_total(category_id, tag_id))
 
     return render_template(
         "public/index.html",
         posts=posts,
-        categories=categories,
-        tags=tags,
         current_category=category_id,
         current_tag=tag_id,
         search_query=search,
+        snippets=snippets,
+    )
+
+
+def listing_page(query, page, total):
+    """
+    One newest-first page of a post listing. Previous/next links carry a
+    ?cursor= / ?before= position so paging through is an index range scan.
+    """
+    return KeysetPagination(
+        query,
+        Post.created_at,
+        Post.id,
+        page=page,
+        per_page=6,
+        total=total,
+        after=decode_cursor(request.args.get("cursor")),
+        before=decode_cursor(request.args.get("before")),
     )
 
 
 @public_bp.route("/post/<slug>")
+@page_cache.cached(post_dependencies)
+@conditional_page(post_validators)
 def post_detail(slug):
     post = Post.query.filter_by(slug=slug, is_published=True).first_or_404()
-    form = CommentForm()
+    # The form's CSRF token is stored in the session; only readers who can
+    # comment get one, so anonymous responses stay cacheable
+    form = CommentForm() if current_user.is_authenticated else None
 
-    # Get top-level comments with eager loading for user relationship
-    # This reduces N+1 queries when displaying comments
-    top_level_comments = (
-        Comment.query
-        .filter_by(post_id=post.id, parent_comment_id=None)
-        .options(
-            db.joinedload(Comment.user),
-            db.joinedload(Comment.comment_likes)
-        )
-        .order_by(Comment.created_at.desc())
-        .all()
-    )
+    # Load the whole comment forest in one query; the template only walks
+    # the prebuilt in-memory tree, so rendering issues no further SQL
+    top_level_comments, comment_nodes = Comment.load_forest(post.id)
     
     # Check if current user has liked the post
     is_post_liked = False
@@ -74,35 +216,23 @@ def post_detail(slug):
     
     if current_user.is_authenticated:
         # Batch query for post like check
-        is_post_liked = Like.query.filter_by(
-            post_id=post.id, 
-            user_id=current_user.id
-        ).first() is not None
+        is_post_liked = like_buffer.pending_liked(current_user.id, post.id)
+        if is_post_liked is None:
+            is_post_liked = Like.query.filter_by(
+                post_id=post.id, 
+                user_id=current_user.id
+            ).first() is not None
         
-        # Get all comment likes for this user in one query (for all comments in post)
-        user_comment_likes = {
-            like.comment_id for like in 
-            CommentLike.query
-            .join(Comment)
-            .filter(Comment.post_id == post.id, CommentLike.user_id == current_user.id)
-            .all()
-        }
+        # Get this user's comment likes on this post only
+        user_comment_likes = CommentLike.liked_in_post(current_user.id, post.id)
 
     # Get related posts (same category)
     related_posts = []
     if post.category_id:
-        related_posts = (
-            Post.query.filter(
-                Post.category_id == post.category_id,
-                Post.id != post.id,
-                Post.is_published == True,
-            )
-            .limit(3)
-            .all()
-        )
+        related_posts = related_posts_query(post.id, post.category_id).all()
     
     # Calculate total comments count for display
-    total_comments = Comment.query.filter_by(post_id=post.id).count()
+    total_comments = len(comment_nodes)
 
     return render_template(
         "public/post_detail.html",
@@ -127,40 +257,27 @@ def like_post(post_id):
             "redirect": url_for('public.login', next=request.referrer or url_for('public.post_detail', slug=post.slug if post else ''))
         }), 401
     
-    post = Post.query.get_or_404(post_id)
-    user_id = current_user.id
-
-    # Check if already liked
-    existing_like = Like.query.filter_by(
-        post_id=post_id, user_id=user_id
-    ).first()
-
-    if existing_like:
-        # Unlike - remove the like
-        db.session.delete(existing_like)
+    if like_buffer.enabled:
+        # Buffered and written in batches; the response is optimistic
+        result = like_buffer.toggle(post_id, current_user.id)
+        if result is None:
+            abort(404)
+    else:
+        # Insert-or-delete plus the counter update, in a single transaction
+        result = Like.toggle(post_id, current_user.id)
+        if result is None:
+            db.session.rollback()
+            abort(404)
         db.session.commit()
-        likes_count = Like.query.filter_by(post_id=post_id).count()
-        return jsonify(
-            {
-                "success": True,
-                "message": "Post unliked",
-                "likes_count": likes_count,
-                "liked": False,
-            }
-        )
-
-    like = Like(post_id=post_id, user_id=user_id)
-    db.session.add(like)
-    db.session.commit()
-
-    likes_count = Like.query.filter_by(post_id=post_id).count()
+    Like.forget_state(current_user.id, post_id)
+    liked, likes_count = result
 
     return jsonify(
         {
             "success": True,
-            "message": "Post liked successfully!",
+            "message": "Post liked successfully!" if liked else "Post unliked",
             "likes_count": likes_count,
-            "liked": True,
+            "liked": liked,
         }
     )
 
@@ -223,6 +340,11 @@ def add_comment(post_id):
     )
 
     db.session.add(comment)
+    Post.adjust_counters(post_id, comments=1)
+    if parent_comment_id:
+        Comment.adjust_counters(parent_comment_id, replies=1)
+    Post.bump_comment_version(post_id)
+    NotificationEvent.enqueue_comment(comment)
     db.session.commit()
 
     flash("Comment added successfully!", "success")
@@ -239,40 +361,21 @@ def like_comment(comment_id):
             "redirect": url_for('public.login', next=request.referrer)
         }), 401
     
-    comment = Comment.query.get_or_404(comment_id)
-    user_id = current_user.id
-
-    # Check if already liked
-    existing_like = CommentLike.query.filter_by(
-        comment_id=comment_id, user_id=user_id
-    ).first()
-
-    if existing_like:
-        # Unlike - remove the like
-        db.session.delete(existing_like)
-        db.session.commit()
-        likes_count = CommentLike.query.filter_by(comment_id=comment_id).count()
-        return jsonify(
-            {
-                "success": True,
-                "message": "Comment unliked",
-                "likes_count": likes_count,
-                "liked": False,
-            }
-        )
-
-    like = CommentLike(comment_id=comment_id, user_id=user_id)
-    db.session.add(like)
+    result = CommentLike.toggle(comment_id, current_user.id)
+    if result is None:
+        db.session.rollback()
+        abort(404)
+    liked, likes_count, post_id = result
+    if liked:
+        NotificationEvent.enqueue(NotificationType.LIKE, current_user.id, post_id, comment_id)
     db.session.commit()
 
-    likes_count = CommentLike.query.filter_by(comment_id=comment_id).count()
-
     return jsonify(
         {
             "success": True,
-            "message": "Comment liked successfully!",
+            "message": "Comment liked successfully!" if liked else "Comment unliked",
             "likes_count": likes_count,
-            "liked": True,
+            "liked": liked,
         }
     )
 
@@ -285,36 +388,141 @@ def get_comments_tree(post_id):
     API endpoint to get all comments for a post as a tree structure.
     Query params:
     - limit: Number of top-level comments to return (default: all)
+    - cursor: next_cursor from the previous page, for "load more"
     - max_depth: Maximum nesting depth (default: 10)
+    - include_total: Set to 0 to skip counting top-level comments (default: 1)
+    - stream: Set to 1 to stream the JSON while walking the tree, for very
+      large threads (same schema, bypasses the payload cache)
+    
+    The user-independent payload is cached per post comment_version; the
+    caller's is_liked flags are overlaid on a copy. Responses carry an ETag
+    from the same version and If-None-Match is answered with 304 up front.
     """
-    post = Post.query.get_or_404(post_id)
+    post = (
+        db.session.query(Post.id, Post.comments_count, Post.comment_version)
+        .filter_by(id=post_id)
+        .first_or_404()
+    )
+    
+    user_id = current_user.id if current_user.is_authenticated else None
+    etag = make_etag(
+        "comments", post.id, post.comment_version, user_id, sorted(request.args.items())
+    )
+    response = not_modified(etag)
+    if response is not None:
+        return response
     
     limit = request.args.get('limit', type=int)
-    max_depth = request.args.get('max_depth', 10, type=int)
+    max_depth = max(request.args.get('max_depth', 10, type=int), 0)
+    include_total = request.args.get('include_total', 1, type=int)
     
-    # Get user ID if authenticated
-    user_id = None
-    if current_user.is_authenticated:
-        user_id = current_user.id
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor)
+    if cursor and after is None:
+        return jsonify({
+            "success": False,
+            "message": "Invalid cursor."
+        }), 400
     
-    comments_tree = Comment.get_comment_tree(
-        post_id=post.id,
-        user_id=user_id,
-        limit_top_level=limit,
-        max_depth=max_depth
+    if request.args.get('stream', 0, type=int):
+        top_level_comments, response = load_comments_page(
+            post, limit, after, max_depth, include_total
+        )
+        chunks = stream_comments_tree(
+            response,
+            top_level_comments,
+            max_depth,
+            CommentLike.liked_in_post(user_id, post.id)
+        )
+        return with_etag(
+            current_app.response_class(chunks, mimetype="application/json"), etag
+        )
+    
+    cache_key = (post.id, post.comment_version, limit, cursor, max_depth, bool(include_total))
+    response = comment_tree_cache.get(cache_key)
+    if response is None:
+        top_level_comments, response = load_comments_page(
+            post, limit, after, max_depth, include_total
+        )
+        response["comments"] = [
+            node.to_dict(max_depth=max_depth) for node in top_level_comments
+        ]
+        comment_tree_cache.set(cache_key, response)
+    
+    # Overlay the current user's liked state without touching the cached payload
+    if user_id:
+        user_liked_ids = CommentLike.liked_in_post(user_id, post.id)
+        if user_liked_ids:
+            response = dict(
+                response,
+                comments=overlay_liked_state(response["comments"], user_liked_ids)
+            )
+    
+    return with_etag(jsonify(response), etag)
+
+
+def load_comments_page(post, limit, after, max_depth, include_total):
+    """
+    Load a keyset page of top-level comments (newest first) with their
+    subtrees. Returns the root nodes and the response fields other than
+    the comments themselves.
+    """
+    top_level_comments, has_more = Comment.load_thread_page(
+        siblings=[Comment.post_id == post.id, Comment.parent_comment_id.is_(None)],
+        scope=[Comment.post_id == post.id],
+        limit=limit,
+        after=after,
+        max_depth=max_depth,
+        newest_first=True
     )
     
-    # Get total comment count
-    total_comments = Comment.query.filter_by(post_id=post.id).count()
-    top_level_count = Comment.query.filter_by(post_id=post.id, parent_comment_id=None).count()
+    next_cursor = None
+    if has_more:
+        last = top_level_comments[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
     
-    return jsonify({
+    response = {
         "success": True,
         "post_id": post.id,
-        "total_comments": total_comments,
-        "top_level_count": top_level_count,
-        "comments": comments_tree
-    })
+        "total_comments": post.comments_count,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+    }
+    if include_total:
+        response["top_level_count"] = Comment.query.filter_by(
+            post_id=post.id, parent_comment_id=None
+        ).count()
+    return top_level_comments, response
+
+
+def stream_comments_tree(fields, top_level_comments, max_depth, liked_ids, chunk_size=16384):
+    """Yield the comments tree response as JSON text in chunks of ~chunk_size"""
+    buffer = [json.dumps(fields, separators=(",", ":"))[:-1], ',"comments":[']
+    buffered = 0
+    for index, node in enumerate(top_level_comments):
+        if index:
+            buffer.append(",")
+        for piece in node.iter_json(max_depth=max_depth, user_liked_ids=liked_ids):
+            buffer.append(piece)
+            buffered += len(piece)
+            if buffered >= chunk_size:
+                yield "".join(buffer)
+                buffer = []
+                buffered = 0
+    buffer.append("]}")
+    yield "".join(buffer)
+
+
+def overlay_liked_state(comments, liked_ids):
+    """Copy serialized comments with is_liked set from liked_ids"""
+    return [
+        dict(
+            comment,
+            is_liked=comment["id"] in liked_ids,
+            replies=overlay_liked_state(comment["replies"], liked_ids)
+        )
+        for comment in comments
+    ]
 
 
 def allowed_image_file(filename):
@@ -419,18 +627,18 @@ def create_comment_api(post_id):
     )
     
     db.session.add(comment)
+    Post.adjust_counters(post_id, comments=1)
+    if parent_comment_id:
+        Comment.adjust_counters(parent_comment_id, replies=1)
+    Post.bump_comment_version(post_id)
+    NotificationEvent.enqueue_comment(comment)
     db.session.commit()
     
-    # Get user's liked comments for response
-    user_liked_ids = {
-        like.comment_id for like in 
-        CommentLike.query.filter_by(user_id=current_user.id).all()
-    }
-    
+    # A comment that was just created cannot have been liked yet
     return jsonify({
         "success": True,
         "message": "Comment added successfully!",
-        "comment": comment.to_dict(include_replies=False, user_liked_ids=user_liked_ids)
+        "comment": comment.to_dict(include_replies=False)
     }), 201
 
 
@@ -478,14 +686,12 @@ def edit_comment_api(comment_id):
     # Sanitize and update comment
     sanitized_content = sanitize_html(content)
     comment.comment = sanitized_content
+    Post.bump_comment_version(comment.post_id)
     
     db.session.commit()
     
-    # Get user's liked comments for response
-    user_liked_ids = {
-        like.comment_id for like in 
-        CommentLike.query.filter_by(user_id=current_user.id).all()
-    }
+    # Only this comment's liked state is needed for the response
+    user_liked_ids = CommentLike.liked_among(current_user.id, [comment.id])
     
     return jsonify({
         "success": True,
@@ -518,19 +724,13 @@ def delete_comment_api(comment_id):
             "message": "You can only delete your own comments."
         }), 403
     
-    # Count how many comments will be deleted (including replies)
-    def count_replies(comment):
-        count = 1  # Count self
-        for reply in comment.get_replies():
-            count += count_replies(reply)
-        return count
-    
-    deleted_count = count_replies(comment)
-    
-    # Delete the comment (cascade will delete replies and likes)
-    db.session.delete(comment)
+    # Delete the comment, its replies, their likes and notifications in bulk
+    deleted_count, images = comment.delete_subtree()
     db.session.commit()
     
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    remove_files_in_background([os.path.join(upload_folder, image) for image in images])
+    
     return jsonify({
         "success": True,
         "message": "Comment deleted successfully!",
@@ -544,79 +744,349 @@ def get_comment_replies(comment_id):
     API endpoint to get replies for a specific comment.
     Query params:
     - limit: Number of replies to return (default: all)
-    - offset: Number of replies to skip (default: 0)
+    - cursor: next_cursor from the previous page, for "load more"
+    - offset: Number of replies to skip (deprecated; ignored when a cursor
+      is given, and slower on long threads)
     - max_depth: Maximum nesting depth for nested replies (default: 5)
+    
+    Responses carry an ETag from the post's comment_version and
+    If-None-Match is answered with 304 before any tree work.
     """
-    comment = Comment.query.get_or_404(comment_id)
+    comment, comment_version = (
+        db.session.query(Comment, Post.comment_version)
+        .join(Post, Post.id == Comment.post_id)
+        .filter(Comment.id == comment_id)
+        .first_or_404()
+    )
+    
+    user_id = current_user.id if current_user.is_authenticated else None
+    etag = make_etag(
+        "replies", comment.id, comment_version, user_id, sorted(request.args.items())
+    )
+    response = not_modified(etag)
+    if response is not None:
+        return response
     
     limit = request.args.get('limit', type=int)
-    offset = request.args.get('offset', 0, type=int)
-    max_depth = request.args.get('max_depth', 5, type=int)
+    max_depth = max(request.args.get('max_depth', 5, type=int), 0)
     
-    # Get user ID if authenticated
-    user_id = None
-    user_liked_ids = set()
-    if current_user.is_authenticated:
-        user_id = current_user.id
-        user_liked_ids = {
-            like.comment_id for like in 
-            CommentLike.query.filter_by(user_id=user_id).all()
-        }
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor)
+    if cursor and after is None:
+        return jsonify({
+            "success": False,
+            "message": "Invalid cursor."
+        }), 400
     
-    # Get replies with pagination
-    query = Comment.query.filter_by(
-        parent_comment_id=comment_id
-    ).order_by(Comment.created_at.asc())
+    # Get user's liked comment IDs on this post if authenticated
+    user_liked_ids = CommentLike.liked_in_post(user_id, comment.post_id)
     
-    total_replies = query.count()
+    # Older clients page with offset; the cursor wins when both are sent
+    offset = 0 if after else max(request.args.get('offset', 0, type=int), 0)
     
-    if offset:
-        query = query.offset(offset)
-    if limit:
-        query = query.limit(limit)
+    # Keyset page of direct replies (oldest first) plus their subtrees
+    replies, has_more = Comment.load_thread_page(
+        siblings=[Comment.post_id == comment.post_id, Comment.parent_comment_id == comment_id],
+        scope=comment.subtree_criteria(include_self=False),
+        limit=limit,
+        after=after,
+        max_depth=max_depth,
+        offset=offset
+    )
     
-    replies = query.all()
+    next_cursor = None
+    if has_more:
+        last = replies[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
     
-    return jsonify({
+    return with_etag(jsonify({
         "success": True,
         "comment_id": comment_id,
-        "total_replies": total_replies,
+        "total_replies": comment.replies_count,
         "offset": offset,
         "limit": limit,
-        "has_more": (offset + len(replies)) < total_replies if limit else False,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
         "replies": [
             reply.to_dict(
-                include_replies=True,
                 max_depth=max_depth,
                 user_liked_ids=user_liked_ids
             ) for reply in replies
         ]
+    }), etag)
+
+
+# ============== Like State API ==============
+
+@public_bp.route("/api/likes/state", methods=["GET"])
+def like_states():
+    """
+    Liked flags and like counts of several posts, for hydrating listing cards
+    in one request.
+    Query params:
+    - post_ids: Comma-separated post ids (max 100)
+    
+    Anonymous readers get the counts with liked=false. Unknown or
+    unpublished ids are left out of the response.
+    """
+    try:
+        post_ids = list(dict.fromkeys(
+            int(value) for value in request.args.get('post_ids', '').split(',') if value.strip()
+        ))
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "message": "post_ids must be a comma-separated list of integers."
+        }), 400
+    
+    if len(post_ids) > 100:
+        return jsonify({
+            "success": False,
+            "message": "At most 100 post ids can be requested at once."
+        }), 400
+    
+    user_id = current_user.id if current_user.is_authenticated else None
+    states = {}
+    for post_id, (liked, likes_count) in Like.states(user_id, post_ids).items():
+        # Likes buffered by this worker and not yet written
+        pending = like_buffer.pending_liked(user_id, post_id) if user_id else None
+        states[str(post_id)] = {
+            "liked": liked if pending is None else pending,
+            "likes_count": max(likes_count + like_buffer.pending_delta(post_id), 0),
+        }
+    
+    return jsonify({
+        "success": True,
+        "states": states
+    })
+
+
+# ============== Notification API Endpoints ==============
+
+@public_bp.route("/api/notifications", methods=["GET"])
+def notifications_api():
+    """
+    API endpoint for the current user's notification inbox, newest first.
+    Query params:
+    - limit: Notifications per page (default: 20, max: 50)
+    - cursor: next_cursor from the previous page
+    - unread: Set to 1 to list unread notifications only
+    """
+    if not current_user.is_authenticated:
+        return jsonify({
+            "success": False,
+            "message": "Please login to see your notifications.",
+            "redirect": url_for('public.login')
+        }), 401
+    
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor)
+    if cursor and after is None:
+        return jsonify({
+            "success": False,
+            "message": "Invalid cursor."
+        }), 400
+    
+    notifications, has_more = Notification.inbox_page(
+        current_user.id,
+        limit=limit,
+        after=after,
+        unread_only=bool(request.args.get('unread', 0, type=int))
+    )
+    
+    next_cursor = None
+    if has_more:
+        last = notifications[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    
+    return jsonify({
+        "success": True,
+        "notifications": [notification.to_dict() for notification in notifications],
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+        "unread_count": Notification.get_unread_count(current_user.id)
+    })
+
+
+@public_bp.route("/api/notifications/unread-count", methods=["GET"])
+def notifications_unread_count():
+    """API endpoint for the unread badge; served from a short per-user cache."""
+    if not current_user.is_authenticated:
+        return jsonify({
+            "success": False,
+            "message": "Please login to see your notifications.",
+            "redirect": url_for('public.login')
+        }), 401
+    
+    return jsonify({
+        "success": True,
+        "unread_count": Notification.get_unread_count(current_user.id)
+    })
+
+
+@public_bp.route("/api/notifications/mark-read", methods=["POST"])
+def notifications_mark_read():
+    """
+    API endpoint to mark notifications as read, in a single UPDATE.
+    JSON body:
+    - ids: Notification IDs to mark (optional; all unread when omitted)
+    """
+    if not current_user.is_authenticated:
+        return jsonify({
+            "success": False,
+            "message": "Please login to see your notifications.",
+            "redirect": url_for('public.login')
+        }), 401
+    
+    data = request.get_json(silent=True) or {}
+    notification_ids = data.get('ids')
+    if notification_ids is not None:
+        if not isinstance(notification_ids, list) or not all(
+            isinstance(notification_id, int) for notification_id in notification_ids
+        ):
+            return jsonify({
+                "success": False,
+                "message": "ids must be a list of notification IDs."
+            }), 400
+    
+    marked = Notification.mark_read(current_user.id, notification_ids)
+    db.session.commit()
+    Notification.forget_unread_count([current_user.id])
+    
+    return jsonify({
+        "success": True,
+        "marked": marked,
+        "unread_count": Notification.get_unread_count(current_user.id)
+    })
+
+
+# ============== Search API Endpoints ==============
+
+@public_bp.route("/api/search", methods=["GET"])
+def search_api():
+    """
+    API endpoint for full-text search over published posts.
+    Query params:
+    - q: Search text (required)
+    - limit: Hits per page (default: 10, max: 50)
+    - cursor: next_cursor from the previous page
+    
+    Hits are ranked by relevance and carry a highlighted snippet_html
+    produced by the search index in the same query.
+    """
+    search = request.args.get('q', '', type=str).strip()
+    if not search:
+        return jsonify({
+            "success": False,
+            "message": "Search text is required."
+        }), 400
+    
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    cursor = request.args.get('cursor')
+    after = decode_search_cursor(cursor)
+    if cursor and after is None:
+        return jsonify({
+            "success": False,
+            "message": "Invalid cursor."
+        }), 400
+    
+    rows, has_more, total = search_page(search, limit, after=after)
+    
+    next_cursor = None
+    if has_more and rows:
+        last_post, last_rank, _ = rows[-1]
+        next_cursor = encode_search_cursor(last_rank, last_post.id)
+    
+    return jsonify({
+        "success": True,
+        "query": search,
+        "total": total,
+        "limit": limit,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+        "hits": [
+            {
+                "id": post.id,
+                "title": post.title,
+                "slug": post.slug,
+                "url": url_for('public.post_detail', slug=post.slug),
+                "snippet_html": highlight_snippet(snippet),
+                "category": post.category.name if post.category else None,
+                "created_at": post.created_at.isoformat() if post.created_at else None,
+            } for post, _, snippet in rows
+        ]
     })
 
 
+@public_bp.route("/api/search/suggest", methods=["GET"])
+def search_suggest():
+    """
+    API endpoint for search-as-you-type suggestions.
+    Query params:
+    - q: Text typed so far; matches the start of any word
+    - limit: Maximum suggestions (default: 8, max: 20)
+    
+    Answered from the in-memory prefix index; the database is only read to
+    pick up new suggestion changes every SUGGESTION_POLL seconds.
+    """
+    prefix = request.args.get('q', '', type=str)
+    limit = min(max(request.args.get('limit', 8, type=int), 1), 20)
+    
+    return jsonify({
+        "success": True,
+        "query": prefix,
+        "suggestions": [
+            {
+                "type": kind,
+                "id": item_id,
+                "label": label,
+                "url": suggestion_url(kind, item_id, slug),
+            } for kind, item_id, label, slug in get_suggestions().suggest(prefix, limit)
+        ]
+    })
+
+
+def suggestion_url(kind, item_id, slug):
+    """Public page a search suggestion links to"""
+    if kind == "post":
+        return url_for('public.post_detail', slug=slug)
+    if kind == "category":
+        return url_for('public.category_posts', category_id=item_id)
+    return url_for('public.tag_posts', tag_id=item_id)
+
+
 @public_bp.route("/category/<int:category_id>")
+@page_cache.cached(lambda category_id: ["taxonomy", f"listing:category:{category_id}"])
+@conditional_page(lambda category_id: listing_validators(
+    Post.listing_total(category_id=category_id), Post.category_id == category_id
+))
 def category_posts(category_id):
     category = Category.query.get_or_404(category_id)
     page = request.args.get("page", 1, type=int)
 
-    posts = (
-        Post.query.filter_by(category_id=category_id, is_published=True)
-        .order_by(Post.created_at.desc())
-        .paginate(page=page, per_page=6, error_out=False)
+    posts = listing_page(
+        Post.listing_query().filter_by(category_id=category_id),
+        page,
+        category.post_count,
     )
 
     return render_template("public/category.html", category=category, posts=posts)
 
 
 @public_bp.route("/tag/<int:tag_id>")
+@page_cache.cached(lambda tag_id: ["taxonomy", f"listing:tag:{tag_id}"])
+@conditional_page(lambda tag_id: listing_validators(
+    Post.listing_total(tag_id=tag_id), Post.has_tag(tag_id)
+))
 def tag_posts(tag_id):
     tag = Tag.query.get_or_404(tag_id)
     page = request.args.get("page", 1, type=int)
 
-    posts = (
-        Post.query.filter(Post.tags.any(Tag.id == tag_id), Post.is_published == True)
-        .order_by(Post.created_at.desc())
-        .paginate(page=page, per_page=6, error_out=False)
+    posts = listing_page(
+        Post.listing_query().filter(Post.has_tag(tag_id)),
+        page,
+        tag.post_count,
     )
 
     return render_template("public/tag.html", tag=tag, posts=posts)
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe, in-process LRU cache whose entries expire after a fixed TTL.
+    Configured like the other extensions: ttl and size are read from
+    <PREFIX>_TTL and <PREFIX>_SIZE in init_app(). A TTL of 0 disables it.
+    """
+
+    def __init__(self, config_prefix, default_ttl=0, default_size=1024):
+        self.config_prefix = config_prefix
+        self.ttl = default_ttl
+        self.max_size = default_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get(f"{self.config_prefix}_TTL", self.ttl)
+        self.max_size = app.config.get(f"{self.config_prefix}_SIZE", self.max_size)
+        self.clear()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        if not self.enabled:
+            return default
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entry if full"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size, for monitoring"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "ttl": self.ttl,
+            }
+
+
+class VersionedCache:
+    """
+    A single value cached in process and reloaded only when a shared version
+    stamp changes, so every worker process sees writes made by the others.
+    The stamp is polled at most once every <PREFIX>_POLL seconds (read in
+    init_app()); a poll interval of 0 disables caching.
+    """
+
+    def __init__(self, config_prefix, default_poll=2):
+        self.config_prefix = config_prefix
+        self.poll = default_poll
+        self.loads = 0
+        self.checks = 0
+        self._value = None
+        self._version = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.poll = app.config.get(f"{self.config_prefix}_POLL", self.poll)
+        self.clear()
+
+    @property
+    def enabled(self):
+        return self.poll > 0
+
+    def get(self, read_version, load):
+        """
+        Return the cached value. read_version() returns the shared stamp and
+        load() builds a fresh value; both run only when the poll is due.
+        """
+        if not self.enabled:
+            return load()
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._next_check:
+                self.checks += 1
+                version = read_version()
+                if self._value is None or version != self._version:
+                    self._value = load()
+                    self._version = version
+                    self.loads += 1
+                self._next_check = now + self.poll
+            return self._value
+
+    def expire(self):
+        """Re-check the version stamp on the next get() (after a local write)"""
+        with self._lock:
+            self._next_check = 0.0
+
+    def clear(self):
+        with self._lock:
+            self._value = None
+            self._version = None
+            self._next_check = 0.0
+
+    def stats(self):
+        """Version checks and reloads, for monitoring"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "version": self._version,
+                "checks": self.checks,
+                "loads": self.loads,
+                "poll": self.poll,
+            }
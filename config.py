@@ -23,6 +23,38 @@ class Config:
     # Pagination
     POSTS_PER_PAGE = 6
     
+    # Caching (in-process, per worker; a TTL of 0 disables a cache)
+    POST_LIKE_STATE_CACHE_TTL = 10  # per (user, post) liked flag and count for listing cards
+    POST_LIKE_STATE_CACHE_SIZE = 4096
+    UNREAD_COUNT_CACHE_TTL = 30  # unread notification badge, per user; dropped on delivery and mark-read
+    UNREAD_COUNT_CACHE_SIZE = 4096
+    COMMENT_TREE_CACHE_TTL = 300  # entries are keyed by Post.comment_version
+    COMMENT_TREE_CACHE_SIZE = 256
+    TAXONOMY_CACHE_POLL = 2  # seconds between checks of the shared taxonomy version
+    SUGGESTION_POLL = 2  # seconds between checks of the search suggestion change log
+    SUGGESTION_LOG_SIZE = 1000  # changes kept; a worker further behind rebuilds its index
+    # Full-page cache for anonymous readers: "memory" (per worker) or
+    # "filesystem" (shared by the workers of one host, in PAGE_CACHE_DIR)
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND') or 'memory'
+    PAGE_CACHE_TTL = 60
+    PAGE_CACHE_SIZE = 512  # pages kept per worker (memory) or in the shared directory (filesystem)
+    PAGE_CACHE_DIR = os.environ.get('PAGE_CACHE_DIR')
+    # s-maxage sent with anonymous HTML pages, for a reverse proxy in front
+    PROXY_CACHE_MAX_AGE = 30
+    
+    # Write-behind post likes: clicks are buffered per worker and written in
+    # batches every LIKE_FLUSH_INTERVAL seconds (see like_buffer.py)
+    LIKE_WRITE_BEHIND = os.environ.get('LIKE_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes')
+    LIKE_FLUSH_INTERVAL = 1.0
+    LIKE_FLUSH_BATCH = 500
+    
+    # Notifications are queued in the notification_outbox table and delivered
+    # in batches by a worker thread; set NOTIFICATION_WORKER=0 to run
+    # process_notifications.py as a separate process instead
+    NOTIFICATION_WORKER = os.environ.get('NOTIFICATION_WORKER', '1').lower() in ('1', 'true', 'yes')
+    NOTIFICATION_POLL_INTERVAL = 1.0
+    NOTIFICATION_BATCH = 200
+    
     # Admin settings
     ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME') or 'admin'
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD') or 'admin123'  # Change in production!
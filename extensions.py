@@ -2,11 +2,22 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
+from cache import TTLCache, VersionedCache
+from page_cache import PageCache
+from like_buffer import LikeBuffer
+from notifications import NotificationWorker
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
 login_manager = LoginManager()
 csrf = CSRFProtect()
+post_like_state_cache = TTLCache("POST_LIKE_STATE_CACHE", default_ttl=10, default_size=4096)
+unread_count_cache = TTLCache("UNREAD_COUNT_CACHE", default_ttl=30, default_size=4096)
+comment_tree_cache = TTLCache("COMMENT_TREE_CACHE", default_ttl=300, default_size=256)
+taxonomy_cache = VersionedCache("TAXONOMY_CACHE", default_poll=2)
+page_cache = PageCache()
+like_buffer = LikeBuffer()
+notification_worker = NotificationWorker()
 
 login_manager.login_view = "public.login"
 login_manager.login_message = "Please log in to continue."
@@ -0,0 +1,273 @@
+"""
+Optional write-behind buffer for post likes.
+
+With LIKE_WRITE_BEHIND enabled, like_post no longer opens a write
+transaction per click. It records the user's intent here and answers with
+an optimistic state and count. Intents are coalesced per (user, post): a
+like followed by an unlike before the next flush cancels out, and only the
+final state of each pair is written. A background thread flushes the
+buffer every LIKE_FLUSH_INTERVAL seconds, writing up to LIKE_FLUSH_BATCH
+pairs per transaction with one insert, one delete and one counter update
+per post.
+
+Writes are idempotent (INSERT ... ON CONFLICT DO NOTHING / DELETE) and the
+stored counters move by the rows actually changed, so the database stays
+exact even when several workers buffer likes for the same post. The
+optimistic state is per process: another worker may show the old count
+until the flush.
+
+The buffer is flushed when the process exits normally (atexit) and on
+SIGTERM, so a graceful shutdown loses nothing; a killed process loses at
+most one interval of clicks. A failed flush puts its intents back and is
+retried.
+"""
+import atexit
+import os
+import signal
+import sys
+import threading
+import time
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+# Seconds SIGTERM waits for the buffer to be written before exiting
+SIGTERM_FLUSH_TIMEOUT = 10
+
+
+class LikeBuffer:
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.interval = 1.0
+        self.batch_size = 500
+        # (user_id, post_id) -> [liked in the database, liked as requested]
+        self._pending = {}
+        self._inflight = {}
+        # post_id -> likes not yet written, applied to the stored count
+        self._deltas = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # Odd while a flush is being written, so its commit may or may not
+        # be visible to a read; even again once its intents are dropped
+        self._generation = 0
+        self._settled = threading.Condition(self._lock)
+        self._thread_pid = None
+        self._sigterm_installed = False
+        self._flushes = 0
+        self._written = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("LIKE_WRITE_BEHIND", False)
+        self.interval = app.config.get("LIKE_FLUSH_INTERVAL", 1.0)
+        self.batch_size = app.config.get("LIKE_FLUSH_BATCH", 500)
+        if self.enabled:
+            atexit.register(self.flush)
+            self._install_sigterm()
+
+    def _install_sigterm(self):
+        """Flush on SIGTERM, then hand over to the previous handler (or exit)"""
+        if self._sigterm_installed:
+            return
+        try:
+            previous = signal.signal(signal.SIGTERM, self._on_sigterm)
+        except ValueError:
+            # Not the main thread: only the atexit flush applies
+            return
+        self._sigterm_installed = True
+        self._previous_sigterm = previous
+
+    def _on_sigterm(self, signum, frame):
+        # Flush from another thread: the signal may have interrupted this
+        # one while it holds the buffer's lock
+        flusher = threading.Thread(target=self.flush, name="like-buffer-sigterm")
+        flusher.start()
+        flusher.join(SIGTERM_FLUSH_TIMEOUT)
+        previous = self._previous_sigterm
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            sys.exit(128 + signum)
+
+    def _start(self):
+        """Start the flusher thread on first use, again in a forked worker"""
+        if self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        threading.Thread(
+            target=self._run, name="like-buffer-flush", daemon=True
+        ).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception("Flushing buffered likes failed")
+
+    def toggle(self, post_id, user_id):
+        """
+        Record a like/unlike of a post by the user. Returns the optimistic
+        (liked, likes_count), or None when the post does not exist.
+        """
+        from extensions import db
+        from models import Like, Post
+
+        liked_in_db = (
+            db.session.query(Like.id).filter_by(post_id=post_id, user_id=user_id).exists()
+        )
+        key = (user_id, post_id)
+        while True:
+            with self._lock:
+                # The commit of a flush being written may or may not be
+                # visible to the read: wait until its intents are dropped
+                while self._generation % 2:
+                    self._settled.wait()
+                generation = self._generation
+            row = (
+                db.session.query(Post.likes_count, liked_in_db)
+                .filter(Post.id == post_id)
+                .first()
+            )
+            if row is None:
+                return None
+            stored_count, stored_liked = row
+            with self._lock:
+                # A flush that started during the read may have committed
+                # intents that the stored state already includes
+                if self._generation == generation:
+                    liked, delta = self._record(key, bool(stored_liked))
+                    break
+        self._start()
+        return liked, max(stored_count + delta, 0)
+
+    def _record(self, key, stored_liked):
+        """Flip the requested state of key (under _lock); returns it and the post's delta"""
+        post_id = key[1]
+        if key in self._pending:
+            persisted, liked = self._pending[key]
+        elif key in self._inflight:
+            # Being written right now: build on the state it will leave
+            persisted = liked = self._inflight[key][1]
+        else:
+            persisted = liked = stored_liked
+        liked = not liked
+        if liked == persisted:
+            self._pending.pop(key, None)
+        else:
+            self._pending[key] = [persisted, liked]
+        delta = self._deltas.get(post_id, 0) + (1 if liked else -1)
+        if delta:
+            self._deltas[post_id] = delta
+        else:
+            self._deltas.pop(post_id, None)
+        return liked, delta
+
+    def pending_liked(self, user_id, post_id):
+        """The user's buffered liked state for a post, or None if nothing is pending"""
+        key = (user_id, post_id)
+        with self._lock:
+            entry = self._pending.get(key) or self._inflight.get(key)
+        return entry[1] if entry else None
+
+    def pending_delta(self, post_id):
+        with self._lock:
+            return self._deltas.get(post_id, 0)
+
+    def flush(self):
+        """Write every buffered intent, in transactions of batch_size pairs"""
+        if self.app is None:
+            return
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        return
+                    keys = list(self._pending)[: self.batch_size]
+                    self._inflight = {key: self._pending.pop(key) for key in keys}
+                    self._generation += 1
+                try:
+                    with self.app.app_context():
+                        self._write(self._inflight)
+                except Exception:
+                    self._restore()
+                    raise
+                with self._lock:
+                    for (user_id, post_id), (persisted, liked) in self._inflight.items():
+                        if persisted != liked:
+                            delta = self._deltas.get(post_id, 0) - (1 if liked else -1)
+                            if delta:
+                                self._deltas[post_id] = delta
+                            else:
+                                self._deltas.pop(post_id, None)
+                    self._written += len(self._inflight)
+                    self._flushes += 1
+                    self._inflight = {}
+                    self._generation += 1
+                    self._settled.notify_all()
+
+    def _restore(self):
+        """Put the intents of a failed flush back, under any newer ones"""
+        with self._lock:
+            for key, (persisted, liked) in self._inflight.items():
+                if key in self._pending:
+                    self._pending[key][0] = persisted
+                    if self._pending[key][1] == persisted:
+                        del self._pending[key]
+                else:
+                    self._pending[key] = [persisted, liked]
+            self._inflight = {}
+            self._generation += 1
+            self._settled.notify_all()
+
+    @staticmethod
+    def _write(intents):
+        from extensions import db
+        from models import Like, Post
+
+        likes, unlikes = {}, {}
+        for (user_id, post_id), (persisted, liked) in intents.items():
+            if persisted != liked:
+                (likes if liked else unlikes).setdefault(post_id, []).append(user_id)
+
+        table = Like.__table__
+        dialect = db.session.get_bind().dialect.name
+        insert = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}.get(dialect)
+        for post_id in set(likes) | set(unlikes):
+            changed = 0
+            if post_id in likes:
+                rows = [{"post_id": post_id, "user_id": user_id} for user_id in likes[post_id]]
+                if insert is not None:
+                    changed += db.session.execute(
+                        insert(table).on_conflict_do_nothing(), rows
+                    ).rowcount
+                else:
+                    existing = {
+                        user_id
+                        for (user_id,) in db.session.query(Like.user_id).filter(
+                            Like.post_id == post_id, Like.user_id.in_(likes[post_id])
+                        )
+                    }
+                    rows = [row for row in rows if row["user_id"] not in existing]
+                    if rows:
+                        changed += db.session.execute(db.insert(table), rows).rowcount
+            if post_id in unlikes:
+                changed -= db.session.execute(
+                    db.delete(table).where(
+                        table.c.post_id == post_id,
+                        table.c.user_id.in_(unlikes[post_id]),
+                    )
+                ).rowcount
+            Post.adjust_counters(post_id, likes=changed)
+        db.session.commit()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "pending": len(self._pending),
+                "inflight": len(self._inflight),
+                "flushes": self._flushes,
+                "written": self._written,
+            }
@@ -0,0 +1,33 @@
+"""
+Migration script to backfill materialized paths for nested comments.
+Rebuilds comments.path and comments.depth from parent_comment_id so that
+subtrees can be fetched, counted and deleted with a single range query.
+
+Run this script once after deploying the new code (safe to re-run):
+    python migrate_comment_path.py
+"""
+
+import os
+import sys
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import Comment
+
+# Create the app (adds the path/depth columns if they are missing)
+app = create_app()
+
+
+def rebuild_comment_paths():
+    """Recompute path and depth for every comment."""
+    with app.app_context():
+        updated = Comment.rebuild_paths()
+        print(f"Rebuilt paths for {updated} comments")
+
+
+if __name__ == '__main__':
+    print("=== Starting Comment Path Migration ===\n")
+    rebuild_comment_paths()
+    print("\n=== Migration process completed! ===")
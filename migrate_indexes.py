@@ -0,0 +1,48 @@
+"""
+Migration script to add the secondary indexes declared on the models.
+Creates any missing index (listings by publish state/category/date, tag
+lookups, media order, comment likes by user, notification inbox) and
+refreshes the planner statistics with ANALYZE.
+
+Run this script once after deploying the new code (safe to re-run):
+    python migrate_indexes.py
+"""
+
+import os
+import sys
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+
+from app import create_app
+from extensions import db
+
+# Create the app (startup also adds missing indexes; this reports them)
+app = create_app()
+
+
+def add_indexes():
+    """Create every model index that is missing from the database."""
+    with app.app_context():
+        inspector = inspect(db.engine)
+        created = 0
+        for table in db.metadata.sorted_tables:
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    print(f"Creating index {index.name} on {table.name}...")
+                    index.create(bind=db.engine)
+                    created += 1
+        print(f"Created {created} indexes")
+
+        with db.engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        print("Planner statistics refreshed")
+
+
+if __name__ == '__main__':
+    print("=== Starting Index Migration ===\n")
+    add_indexes()
+    print("\n=== Migration process completed! ===")
@@ -1,10 +1,17 @@
-from extensions import db, bcrypt
+from extensions import db, bcrypt, post_like_state_cache, unread_count_cache, taxonomy_cache, page_cache
 from flask_login import UserMixin
 from datetime import datetime
-from sqlalchemy import func
+import json
+from collections import namedtuple
+from sqlalchemy import func, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from functools import wraps
 from flask import redirect, url_for, flash, abort
 from flask_login import current_user
+from utils import html_to_text
 
 
 # Role constants for scalability
@@ -100,12 +107,99 @@ class Admin(UserMixin, db.Model):
         return bcrypt.check_password_hash(self.password_hash, password)
 
 
+class SiteCounter(db.Model):
+    """Named site-wide counters, e.g. the number of published posts"""
+
+    __tablename__ = "site_counters"
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+
+    PUBLISHED_POSTS = "published_posts"
+    # Bumped whenever categories or tags are added or removed
+    TAXONOMY_VERSION = "taxonomy_version"
+    # Bumped whenever their published post counts change
+    TAXONOMY_COUNTS_VERSION = "taxonomy_counts_version"
+
+    @staticmethod
+    def get(name):
+        value = db.session.query(SiteCounter.value).filter_by(name=name).scalar()
+        return value or 0
+
+    @staticmethod
+    def adjust(name, delta):
+        """Shift a counter in the current transaction, creating it on first use"""
+        updated = db.session.execute(
+            db.update(SiteCounter)
+            .where(SiteCounter.name == name)
+            .values(value=SiteCounter.value + delta)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            db.session.execute(db.insert(SiteCounter).values(name=name, value=delta))
+
+    def __repr__(self):
+        return f"<SiteCounter {self.name}={self.value}>"
+
+
+TaxonomyEntry = namedtuple("TaxonomyEntry", "id name post_count")
+Taxonomy = namedtuple("Taxonomy", "categories tags")
+
+
+def get_taxonomy():
+    """
+    Categories and tags in name order, with their published post counts, for
+    navigation and sidebars. Served from the process-wide taxonomy cache,
+    which reloads when either shared taxonomy version moves.
+    """
+    return taxonomy_cache.get(_taxonomy_versions, _load_taxonomy)
+
+
+def _taxonomy_versions():
+    return (
+        SiteCounter.get(SiteCounter.TAXONOMY_VERSION),
+        SiteCounter.get(SiteCounter.TAXONOMY_COUNTS_VERSION),
+    )
+
+
+def _load_taxonomy():
+    categories = db.session.query(Category.id, Category.name, Category.post_count)
+    tags = db.session.query(Tag.id, Tag.name, Tag.post_count)
+    return Taxonomy(
+        categories=[TaxonomyEntry(*row) for row in categories.order_by(Category.name)],
+        tags=[TaxonomyEntry(*row) for row in tags.order_by(Tag.name)],
+    )
+
+
+def touch_taxonomy():
+    """
+    Mark categories/tags as changed in the current transaction; every worker
+    reloads its taxonomy cache on its next version check.
+    """
+    SiteCounter.adjust(SiteCounter.TAXONOMY_VERSION, 1)
+    taxonomy_cache.expire()
+    # Every public page shows the category menu
+    page_cache.invalidate("taxonomy")
+
+
+def touch_taxonomy_counts():
+    """
+    Mark the category/tag post counts as changed in the current transaction.
+    Only the index sidebar shows them, so other pages stay cached.
+    """
+    SiteCounter.adjust(SiteCounter.TAXONOMY_COUNTS_VERSION, 1)
+    taxonomy_cache.expire()
+    page_cache.invalidate("taxonomy:counts")
+
+
 class Category(db.Model):
     __tablename__ = "categories"
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Published posts in the category, kept in step by the admin post routes
+    post_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
 
     posts = db.relationship(
         "Post", backref="category", lazy=True, cascade="all, delete-orphan"
@@ -121,6 +215,8 @@ class Tag(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Published posts with the tag, kept in step by the admin post routes
+    post_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
 
     posts = db.relationship(
         "Post", secondary="post_tags", backref="tags", lazy="dynamic"
@@ -134,6 +230,8 @@ post_tags = db.Table(
     "post_tags",
     db.Column("post_id", db.Integer, db.ForeignKey("posts.id"), primary_key=True),
     db.Column("tag_id", db.Integer, db.ForeignKey("tags.id"), primary_key=True),
+    # The primary key leads with post_id; tag listings look up by tag_id
+    db.Index("ix_post_tags_tag_post", "tag_id", "post_id"),
 )
 
 
@@ -153,6 +251,24 @@ class Post(db.Model):
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
     )
+    # Denormalized counters, kept in step by like/comment routes
+    likes_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    comments_count = db.Column(
+        db.Integer, default=0, server_default="0", nullable=False
+    )
+    # Bumped on every comment create/edit/delete/like; keys the comment caches
+    comment_version = db.Column(
+        db.Integer, default=0, server_default="0", nullable=False
+    )
+    # Derived from content when a post is saved, so listings never load it
+    excerpt = db.Column(db.Text, nullable=True)
+    word_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    reading_time = db.Column(
+        db.Integer, default=1, server_default="1", nullable=False
+    )  # minutes
+
+    EXCERPT_LENGTH = 150
+    WORDS_PER_MINUTE = 200
 
     comments = db.relationship(
         "Comment",
@@ -173,16 +289,197 @@ class Post(db.Model):
         order_by="PostMedia.order_index",
     )
 
+    # Indexes for the newest-first listings (public, per category, admin)
+    __table_args__ = (
+        db.Index("ix_posts_published_created", "is_published", "created_at", "id"),
+        db.Index(
+            "ix_posts_category_published_created",
+            "category_id",
+            "is_published",
+            "created_at",
+            "id",
+        ),
+        db.Index("ix_posts_created_at", "created_at"),
+    )
+
     def __repr__(self):
         return f"<Post {self.title}>"
 
-    @property
-    def likes_count(self):
-        return len(self.likes)
+    @staticmethod
+    def text_stats(content):
+        """Plain-text excerpt, word count and reading time of HTML content"""
+        text = html_to_text(content)
+        excerpt = text
+        if len(text) > Post.EXCERPT_LENGTH:
+            cut = text[: Post.EXCERPT_LENGTH].rsplit(" ", 1)[0]
+            excerpt = cut.rstrip(" ,.;:") + "..."
+        word_count = len(text.split())
+        reading_time = max(1, -(-word_count // Post.WORDS_PER_MINUTE))
+        return {"excerpt": excerpt, "word_count": word_count, "reading_time": reading_time}
+
+    def refresh_text_stats(self):
+        """Recompute the stored excerpt/word count/reading time from content"""
+        for name, value in Post.text_stats(self.content).items():
+            setattr(self, name, value)
 
-    @property
-    def comments_count(self):
-        return len(self.comments)
+    @staticmethod
+    def backfill_text_stats(batch_size=200):
+        """
+        Compute the stored text stats for every post, a batch at a time.
+        Not an edit, so updated_at is left alone. Returns posts updated.
+        """
+        table = Post.__table__
+        statement = (
+            table.update()
+            .where(table.c.id == db.bindparam("post_id"))
+            .values(
+                excerpt=db.bindparam("new_excerpt"),
+                word_count=db.bindparam("new_word_count"),
+                reading_time=db.bindparam("new_reading_time"),
+                updated_at=table.c.updated_at,
+            )
+        )
+        updated = 0
+        last_id = 0
+        while True:
+            rows = (
+                db.session.query(Post.id, Post.content)
+                .filter(Post.id > last_id)
+                .order_by(Post.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            params = []
+            for post_id, content in rows:
+                stats = Post.text_stats(content)
+                params.append({
+                    "post_id": post_id,
+                    "new_excerpt": stats["excerpt"],
+                    "new_word_count": stats["word_count"],
+                    "new_reading_time": stats["reading_time"],
+                })
+            db.session.execute(statement, params)
+            db.session.commit()
+            updated += len(rows)
+            last_id = rows[-1][0]
+        return updated
+
+    @staticmethod
+    def listing_query(published_only=True, with_media=True):
+        """
+        Base query for post listings. The category is joined in and media are
+        batch-loaded for the whole page in one extra query; like and comment
+        counts are stored columns and cards show the stored excerpt, so the
+        content column is never loaded and rendering a card issues no queries.
+        """
+        query = Post.query.options(defer(Post.content), joinedload(Post.category))
+        if with_media:
+            query = query.options(selectinload(Post.media))
+        if published_only:
+            query = query.filter(Post.is_published.is_(True))
+        return query
+
+    def listing_keys(self):
+        """
+        The listings this post is counted in: ("all", None), ("category", id)
+        and ("tag", id) for each tag. Unpublished posts are in none.
+        """
+        if not self.is_published:
+            return set()
+        keys = {("all", None)}
+        if self.category_id:
+            keys.add(("category", self.category_id))
+        keys.update(("tag", tag.id) for tag in self.tags)
+        return keys
+
+    @staticmethod
+    def adjust_listing_counts(before, after):
+        """
+        Move the stored listing totals from a post's listing_keys() before a
+        change to its keys after it, in the current transaction.
+        """
+        changed = before ^ after
+        if any(kind != "all" for kind, _ in changed):
+            touch_taxonomy_counts()
+        for delta, keys in ((-1, before - after), (1, after - before)):
+            for kind, key_id in keys:
+                if kind == "all":
+                    SiteCounter.adjust(SiteCounter.PUBLISHED_POSTS, delta)
+                else:
+                    model = Category if kind == "category" else Tag
+                    db.session.execute(
+                        db.update(model)
+                        .where(model.id == key_id)
+                        .values(post_count=model.post_count + delta)
+                        .execution_options(synchronize_session=False)
+                    )
+
+    def invalidate_pages(self, listed_before=frozenset()):
+        """
+        Invalidate the cached pages showing this post once the transaction
+        commits: its detail page and the listings it was or now is in.
+        """
+        names = {f"post:{self.id}"}
+        for kind, key_id in listed_before | self.listing_keys():
+            names.add("listing:all" if kind == "all" else f"listing:{kind}:{key_id}")
+        page_cache.invalidate(*names)
+
+    @staticmethod
+    def has_tag(tag_id):
+        """
+        Filter criterion for posts carrying a tag. An IN over post_tags lets
+        the planner start from the tag's rows instead of probing every post.
+        """
+        return Post.id.in_(
+            db.select(post_tags.c.post_id).where(post_tags.c.tag_id == tag_id)
+        )
+
+    @staticmethod
+    def listing_total(category_id=None, tag_id=None):
+        """
+        Stored number of published posts in a listing, or None for filter
+        combinations that have no counter of their own.
+        """
+        if category_id and tag_id:
+            return None
+        if category_id:
+            count = db.session.query(Category.post_count).filter_by(id=category_id).scalar()
+            return count or 0
+        if tag_id:
+            count = db.session.query(Tag.post_count).filter_by(id=tag_id).scalar()
+            return count or 0
+        return SiteCounter.get(SiteCounter.PUBLISHED_POSTS)
+
+    @staticmethod
+    def adjust_counters(post_id, likes=0, comments=0):
+        """Shift a post's stored counters in the current transaction"""
+        values = {}
+        if likes:
+            values["likes_count"] = Post.likes_count + likes
+        if comments:
+            values["comments_count"] = Post.comments_count + comments
+        if values:
+            # Counters are not edits: keep updated_at from firing its onupdate
+            db.session.execute(
+                db.update(Post)
+                .where(Post.id == post_id)
+                .values(updated_at=Post.updated_at, **values)
+            )
+            page_cache.invalidate(f"post:{post_id}")
+
+    @staticmethod
+    def bump_comment_version(post_id):
+        """Invalidate cached comment payloads of a post in the current transaction"""
+        db.session.execute(
+            db.update(Post)
+            .where(Post.id == post_id)
+            .values(
+                comment_version=Post.comment_version + 1, updated_at=Post.updated_at
+            )
+        )
+        page_cache.invalidate(f"post:{post_id}")
 
     @property
     def images(self):
@@ -213,6 +510,10 @@ class PostMedia(db.Model):
     )  # For ordering multiple media
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        db.Index("ix_post_media_post_order", "post_id", "order_index"),
+    )
+
     def __repr__(self):
         return f"<PostMedia {self.filename}>"
 
@@ -232,6 +533,15 @@ class Comment(db.Model):
     comment = db.Column(db.Text, nullable=False)  # Content of the comment
     image = db.Column(db.String(255), nullable=True)  # Optional image attachment
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Materialized path of zero-padded ids from the root down to this comment,
+    # e.g. "0000000012/0000000034/". A subtree is one indexed range scan.
+    path = db.Column(db.Text, nullable=True, index=True)
+    depth = db.Column(db.Integer, default=0, nullable=False)  # 0 for top-level
+    # Denormalized counters, kept in step by like/comment routes
+    likes_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    replies_count = db.Column(
+        db.Integer, default=0, server_default="0", nullable=False
+    )  # Direct replies only
 
     # Self-referential relationship for nested comments (with cascade delete)
     parent = db.relationship(
@@ -247,6 +557,7 @@ class Comment(db.Model):
     # Index for faster queries
     __table_args__ = (
         db.Index("idx_comment_post_parent", "post_id", "parent_comment_id"),
+        db.Index("ix_comments_created_at", "created_at"),
     )
 
     @property
@@ -269,18 +580,18 @@ class Comment(db.Model):
     def __repr__(self):
         return f"<Comment {self.id}>"
 
-    @property
-    def likes_count(self):
-        return len(self.comment_likes)
-
-    @property
-    def replies_count(self):
-        """Get count of direct replies"""
-        return (
-            self.replies.count()
-            if hasattr(self.replies, "count")
-            else len(list(self.replies))
-        )
+    @staticmethod
+    def adjust_counters(comment_id, likes=0, replies=0):
+        """Shift a comment's stored counters in the current transaction"""
+        values = {}
+        if likes:
+            values["likes_count"] = Comment.likes_count + likes
+        if replies:
+            values["replies_count"] = Comment.replies_count + replies
+        if values:
+            db.session.execute(
+                db.update(Comment).where(Comment.id == comment_id).values(**values)
+            )
 
     def get_replies(self, limit=None):
         """Get direct replies to this comment with optional limit"""
@@ -298,7 +609,18 @@ class Comment(db.Model):
         if user_liked_ids is None:
             user_liked_ids = set()
 
-        data = {
+        if include_replies and current_depth < max_depth:
+            # Build the subtree from one range query on path instead of
+            # recursing through get_replies() one query per comment
+            node = self.load_subtree(max_depth=max_depth - current_depth)
+            if node is not None:
+                return node.to_dict(
+                    max_depth=max_depth,
+                    current_depth=current_depth,
+                    user_liked_ids=user_liked_ids,
+                )
+
+        return {
             "id": self.id,
             "post_id": self.post_id,
             "parent_comment_id": self.parent_comment_id,
@@ -311,18 +633,315 @@ class Comment(db.Model):
             "replies_count": self.replies_count,
             "is_liked": self.id in user_liked_ids,
             "depth": current_depth,
+            "replies": [],
+            "has_more_replies": self.replies_count > 0,
         }
 
-        if include_replies and current_depth < max_depth:
-            replies = self.get_replies()
+    @staticmethod
+    def _fetch_nodes(*criteria):
+        """
+        Fetch the comments matching criteria in a single query, with author
+        names and stored counters, and link them to each other in memory.
+        Returns {id: CommentNode} in (created_at, id) order.
+        """
+        rows = (
+            db.session.query(
+                Comment.id,
+                Comment.post_id,
+                Comment.parent_comment_id,
+                Comment.user_id,
+                Comment.name,
+                Comment.comment,
+                Comment.image,
+                Comment.created_at,
+                User.full_name,
+                User.username,
+                Comment.likes_count,
+                Comment.replies_count,
+            )
+            .outerjoin(User, User.id == Comment.user_id)
+            .filter(*criteria)
+            .all()
+        )
+        # Sorted here rather than in SQL: with an ORDER BY, SQLite prefers
+        # walking the created_at index over the whole table to a sort of
+        # the few rows the path ranges select
+        rows.sort(key=lambda row: (row.created_at, row.id))
+
+        nodes = {row.id: CommentNode(row) for row in rows}
+        for node in nodes.values():
+            parent = nodes.get(node.parent_comment_id)
+            if parent is not None:
+                node.parent = parent
+                parent.children.append(node)
+        return nodes
+
+    @staticmethod
+    def load_forest(post_id):
+        """
+        Load every comment of a post in a single query and link them in memory.
+        Returns (roots, nodes_by_id): roots are newest first, replies oldest first.
+        """
+        nodes = Comment._fetch_nodes(Comment.post_id == post_id)
+        roots = [node for node in nodes.values() if node.parent_comment_id is None]
+        roots.reverse()
+        return roots, nodes
+
+    @staticmethod
+    def load_thread_page(
+        siblings,
+        scope,
+        limit=None,
+        after=None,
+        max_depth=None,
+        newest_first=False,
+        offset=0,
+    ):
+        """
+        Load one keyset page of sibling comments together with their subtrees.
+
+        siblings: criteria selecting the sibling set (e.g. a post's top-level comments)
+        scope: criteria covering every descendant of that set, used for large pages
+        after: (created_at, id) of the last sibling on the previous page
+        max_depth: levels to load below each sibling
+        offset: siblings to skip, for clients that still page by offset
+
+        Returns (page_nodes, has_more) using two queries whatever the position.
+        """
+        key = db.tuple_(Comment.created_at, Comment.id)
+        query = db.session.query(Comment.id, Comment.path, Comment.depth).filter(
+            *siblings
+        )
+        if newest_first:
+            if after is not None:
+                query = query.filter(key < after)
+            query = query.order_by(Comment.created_at.desc(), Comment.id.desc())
+        else:
+            if after is not None:
+                query = query.filter(key > after)
+            query = query.order_by(Comment.created_at.asc(), Comment.id.asc())
+        if offset:
+            query = query.offset(offset)
+        if limit:
+            query = query.limit(limit + 1)
+
+        heads = query.all()
+        has_more = bool(limit) and len(heads) > limit
+        if has_more:
+            heads = heads[:limit]
+        if not heads:
+            return [], has_more
+
+        # Small pages fetch exactly their own subtrees as path ranges; huge
+        # pages fall back to the enclosing scope to keep the SQL bounded
+        if len(heads) <= 100:
+            criteria = [
+                db.or_(
+                    *[
+                        db.and_(Comment.path >= h.path, Comment.path < h.path[:-1] + "0")
+                        for h in heads
+                    ]
+                )
+            ]
+        else:
+            criteria = list(scope)
+        if max_depth is not None:
+            # Never cut off the heads themselves
+            criteria.append(Comment.depth <= heads[0].depth + max(max_depth, 0))
+
+        nodes = Comment._fetch_nodes(*criteria)
+        return [nodes[h.id] for h in heads if h.id in nodes], has_more
+
+    def load_subtree(self, max_depth=None):
+        """
+        Load this comment and its descendants (at most max_depth levels
+        below it) with one range query on path. Returns the root CommentNode.
+        """
+        criteria = self.subtree_criteria()
+        if max_depth is not None:
+            criteria.append(Comment.depth <= self.depth + max_depth)
+        return Comment._fetch_nodes(*criteria).get(self.id)
+
+    def subtree_criteria(self, include_self=True):
+        """Filter matching this comment's subtree as a range on the path index"""
+        # "/" sorts right before "0", so every descendant path falls in
+        # [path, path-with-trailing-slash-replaced-by-"0")
+        criteria = [Comment.path >= self.path, Comment.path < self.path[:-1] + "0"]
+        if not include_self:
+            criteria.append(Comment.id != self.id)
+        return criteria
+
+    def delete_subtree(self):
+        """
+        Delete this comment, every reply below it and their likes and
+        notifications with a handful of set-based statements, keeping the
+        post and parent counters in step. Does not commit.
+        Returns (deleted_count, image_filenames) so callers can clean up files.
+        """
+        subtree = self.subtree_criteria()
+        rows = db.session.query(Comment.id, Comment.image).filter(*subtree).all()
+        subtree_ids = db.select(Comment.id).where(*subtree)
+
+        db.session.execute(
+            db.delete(CommentLike)
+            .where(CommentLike.comment_id.in_(subtree_ids))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            db.delete(Notification)
+            .where(Notification.comment_id.in_(subtree_ids))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            db.delete(Comment)
+            .where(*subtree)
+            .execution_options(synchronize_session=False)
+        )
+
+        Post.adjust_counters(self.post_id, comments=-len(rows))
+        if self.parent_comment_id:
+            Comment.adjust_counters(self.parent_comment_id, replies=-1)
+        Post.bump_comment_version(self.post_id)
+
+        return len(rows), [image for _, image in rows if image]
+
+    @staticmethod
+    def make_path(comment_id, parent_path=None):
+        """Build the materialized path for a comment under parent_path"""
+        return f"{parent_path or ''}{comment_id:010d}/"
+
+    @staticmethod
+    def rebuild_paths():
+        """
+        Recompute path and depth for every comment from parent_comment_id.
+        Used to backfill existing rows; returns the number of comments updated.
+        """
+        parents = dict(db.session.query(Comment.id, Comment.parent_comment_id).all())
+        resolved = {}
+
+        for comment_id in parents:
+            # Walk up until an already-resolved ancestor (or a root) is found
+            chain = []
+            current = comment_id
+            while current is not None and current not in resolved and current not in chain:
+                chain.append(current)
+                current = parents.get(current)
+            path, depth = resolved.get(current, (None, -1))
+            for node_id in reversed(chain):
+                depth += 1
+                path = Comment.make_path(node_id, path)
+                resolved[node_id] = (path, depth)
+
+        if resolved:
+            db.session.execute(
+                db.update(Comment),
+                [
+                    {"id": comment_id, "path": path, "depth": depth}
+                    for comment_id, (path, depth) in resolved.items()
+                ],
+            )
+        db.session.commit()
+        return len(resolved)
+
+    @staticmethod
+    def get_comment_tree(post_id, user_id=None, limit_top_level=None, max_depth=10):
+        """
+        Get all comments for a post as a tree structure.
+        Top-level comments and their subtrees are fetched with two queries
+        and assembled in memory.
+        """
+        # Only the user's likes on this post matter for the tree
+        user_liked_ids = CommentLike.liked_in_post(user_id, post_id)
+
+        top_level_comments, _ = Comment.load_thread_page(
+            siblings=[Comment.post_id == post_id, Comment.parent_comment_id.is_(None)],
+            scope=[Comment.post_id == post_id],
+            limit=limit_top_level,
+            max_depth=max_depth,
+            newest_first=True,
+        )
+
+        return [
+            node.to_dict(max_depth=max_depth, user_liked_ids=user_liked_ids)
+            for node in top_level_comments
+        ]
+
+
+class CommentNode:
+    """Lightweight, query-free view of a comment inside a prefetched tree"""
+
+    __slots__ = (
+        "id",
+        "post_id",
+        "parent_comment_id",
+        "user_id",
+        "comment",
+        "image",
+        "created_at",
+        "display_name",
+        "likes_count",
+        "replies_count",
+        "parent",
+        "children",
+    )
+
+    def __init__(self, row):
+        self.id = row.id
+        self.post_id = row.post_id
+        self.parent_comment_id = row.parent_comment_id
+        self.user_id = row.user_id
+        self.comment = row.comment
+        self.image = row.image
+        self.created_at = row.created_at
+        if row.user_id is not None and row.username is not None:
+            self.display_name = row.full_name or row.username
+        else:
+            self.display_name = row.name or "Anonymous"
+        self.likes_count = row.likes_count or 0
+        self.replies_count = row.replies_count or 0
+        self.parent = None
+        self.children = []
+
+    def __repr__(self):
+        return f"<CommentNode {self.id}>"
+
+    @property
+    def parent_display_name(self):
+        """Display name of the comment being replied to, if it was loaded"""
+        return self.parent.display_name if self.parent is not None else None
+
+    def _fields(self, current_depth, user_liked_ids):
+        """Scalar fields of the serialized comment, without its replies"""
+        return {
+            "id": self.id,
+            "post_id": self.post_id,
+            "parent_comment_id": self.parent_comment_id,
+            "user_id": self.user_id,
+            "content": self.comment,
+            "image": self.image,
+            "author": self.display_name,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "likes_count": self.likes_count,
+            "replies_count": self.replies_count,
+            "is_liked": self.id in user_liked_ids,
+            "depth": current_depth,
+        }
+
+    def to_dict(self, max_depth=10, current_depth=0, user_liked_ids=None):
+        """Same JSON shape as Comment.to_dict, built from in-memory data only"""
+        if user_liked_ids is None:
+            user_liked_ids = set()
+
+        data = self._fields(current_depth, user_liked_ids)
+
+        if current_depth < max_depth:
             data["replies"] = [
                 reply.to_dict(
-                    include_replies=True,
                     max_depth=max_depth,
                     current_depth=current_depth + 1,
                     user_liked_ids=user_liked_ids,
                 )
-                for reply in replies
+                for reply in self.children
             ]
         else:
             data["replies"] = []
@@ -330,38 +949,206 @@ class Comment(db.Model):
 
         return data
 
-    @staticmethod
-    def get_comment_tree(post_id, user_id=None, limit_top_level=None, max_depth=10):
+    def iter_json(self, max_depth=10, current_depth=0, user_liked_ids=None):
         """
-        Get all comments for a post as a tree structure.
-        Optimized to minimize database queries.
+        Yield the JSON text of to_dict() piece by piece while walking the
+        subtree, so large trees are never held as nested dicts or one string.
         """
-        # Get user's liked comment IDs
-        user_liked_ids = set()
-        if user_id:
-            from models import CommentLike
-
-            user_liked_ids = {
-                like.comment_id
-                for like in CommentLike.query.filter_by(user_id=user_id).all()
-            }
+        if user_liked_ids is None:
+            user_liked_ids = set()
 
-        # Get top-level comments
-        query = Comment.query.filter_by(
-            post_id=post_id, parent_comment_id=None
-        ).order_by(Comment.created_at.desc())
+        # An explicit stack of pending nodes and literal chunks keeps deep
+        # threads clear of the recursion limit
+        stack = [(self, current_depth)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                yield item
+                continue
+
+            node, depth = item
+            head = json.dumps(
+                node._fields(depth, user_liked_ids), separators=(",", ":")
+            )[:-1]
+
+            if depth >= max_depth:
+                more = "true" if node.replies_count > 0 else "false"
+                yield f'{head},"replies":[],"has_more_replies":{more}}}'
+                continue
+
+            yield head + ',"replies":['
+            stack.append("]}")
+            for index in range(len(node.children) - 1, -1, -1):
+                stack.append((node.children[index], depth + 1))
+                if index:
+                    stack.append(",")
+
+
+@event.listens_for(Comment, "after_insert")
+def assign_comment_path(mapper, connection, target):
+    """Maintain path/depth for new comments in the same transaction"""
+    parent_path, depth = None, 0
+    if target.parent_comment_id is not None:
+        parent = connection.execute(
+            db.select(Comment.path, Comment.depth).where(
+                Comment.id == target.parent_comment_id
+            )
+        ).first()
+        if parent is not None:
+            parent_path, depth = parent.path, parent.depth + 1
+
+    path = Comment.make_path(target.id, parent_path)
+    connection.execute(
+        db.update(Comment.__table__)
+        .where(Comment.__table__.c.id == target.id)
+        .values(path=path, depth=depth)
+    )
+    set_committed_value(target, "path", path)
+    set_committed_value(target, "depth", depth)
 
-        if limit_top_level:
-            query = query.limit(limit_top_level)
 
-        top_level_comments = query.all()
+def recount_counters():
+    """
+    Recompute every denormalized like/comment/reply counter from the child
+    tables, and the listing totals, repairing any drift. Returns the number of rows that were fixed.
+    """
+    post_likes = (
+        db.select(func.count(Like.id))
+        .where(Like.post_id == Post.id)
+        .scalar_subquery()
+    )
+    post_comments = (
+        db.select(func.count(Comment.id))
+        .where(Comment.post_id == Post.id)
+        .scalar_subquery()
+    )
+    comment_likes = (
+        db.select(func.count(CommentLike.id))
+        .where(CommentLike.comment_id == Comment.id)
+        .scalar_subquery()
+    )
+    replies = db.aliased(Comment)
+    comment_replies = (
+        db.select(func.count(replies.id))
+        .where(replies.post_id == Comment.post_id, replies.parent_comment_id == Comment.id)
+        .scalar_subquery()
+    )
 
-        return [
-            comment.to_dict(
-                include_replies=True, max_depth=max_depth, user_liked_ids=user_liked_ids
+    fixed = db.session.execute(
+        db.update(Post)
+        .where(
+            db.or_(
+                Post.likes_count != post_likes,
+                Post.comments_count != post_comments,
             )
-            for comment in top_level_comments
-        ]
+        )
+        .values(
+            likes_count=post_likes,
+            comments_count=post_comments,
+            updated_at=Post.updated_at,
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    fixed += db.session.execute(
+        db.update(Comment)
+        .where(
+            db.or_(
+                Comment.likes_count != comment_likes,
+                Comment.replies_count != comment_replies,
+            )
+        )
+        .values(likes_count=comment_likes, replies_count=comment_replies)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    fixed += recount_listing_totals()
+    db.session.commit()
+    return fixed
+
+
+def recount_listing_totals():
+    """
+    Recompute the published post totals per category, per tag and site-wide
+    in the current transaction. Returns the number of totals that were fixed.
+    """
+    published = Post.is_published.is_(True)
+    category_posts = (
+        db.select(func.count(Post.id))
+        .where(Post.category_id == Category.id, published)
+        .scalar_subquery()
+    )
+    tag_posts = (
+        db.select(func.count(Post.id))
+        .join(post_tags, post_tags.c.post_id == Post.id)
+        .where(post_tags.c.tag_id == Tag.id, published)
+        .scalar_subquery()
+    )
+
+    fixed = db.session.execute(
+        db.update(Category)
+        .where(Category.post_count != category_posts)
+        .values(post_count=category_posts)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    fixed += db.session.execute(
+        db.update(Tag)
+        .where(Tag.post_count != tag_posts)
+        .values(post_count=tag_posts)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    total = db.session.query(func.count(Post.id)).filter(published).scalar()
+    stored = SiteCounter.get(SiteCounter.PUBLISHED_POSTS)
+    if stored != total:
+        SiteCounter.adjust(SiteCounter.PUBLISHED_POSTS, total - stored)
+        fixed += 1
+    return fixed
+
+
+def _toggle_like_row(table, target_column, target_id, user_id):
+    """
+    Insert the user's like row, or delete it when it already exists, in the
+    current transaction. Returns the change to apply to the stored counter:
+    1, -1, or 0 when a concurrent request already removed the row.
+    """
+    values = {target_column: target_id, "user_id": user_id}
+    dialect = db.session.get_bind().dialect
+    if dialect.name in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect.name == "sqlite" else postgresql.insert
+        inserted = db.session.execute(
+            insert(table).values(**values).on_conflict_do_nothing()
+        ).rowcount
+    else:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(table).values(**values))
+            inserted = 1
+        except IntegrityError:
+            inserted = 0
+    if inserted:
+        return 1
+    deleted = db.session.execute(
+        db.delete(table).where(
+            table.c[target_column] == target_id, table.c.user_id == user_id
+        )
+    ).rowcount
+    return -1 if deleted else 0
+
+
+def _shift_likes_count(model, target_id, delta, columns, **values):
+    """
+    Apply delta to a stored likes_count and return the requested columns of
+    the updated row, or None when the row does not exist.
+    """
+    stmt = (
+        db.update(model)
+        .where(model.id == target_id)
+        .values(likes_count=model.likes_count + delta, **values)
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.get_bind().dialect.update_returning:
+        return db.session.execute(stmt.returning(*columns)).first()
+    db.session.execute(stmt)
+    return db.session.query(*columns).filter(model.id == target_id).first()
 
 
 class Like(db.Model):
@@ -377,6 +1164,63 @@ class Like(db.Model):
     def __repr__(self):
         return f"<Like {self.id}>"
 
+    @staticmethod
+    def toggle(post_id, user_id):
+        """
+        Like or unlike a post for the user in the current transaction.
+        Returns (liked, likes_count) from the stored counter, or None when the
+        post does not exist; the caller should roll back in that case.
+        """
+        delta = _toggle_like_row(Like.__table__, "post_id", post_id, user_id)
+        # Counters are not edits: keep updated_at from firing its onupdate
+        row = _shift_likes_count(
+            Post, post_id, delta, (Post.likes_count,), updated_at=Post.updated_at
+        )
+        if row is None:
+            return None
+        page_cache.invalidate(f"post:{post_id}")
+        return delta > 0, row.likes_count
+
+    @staticmethod
+    def states(user_id, post_ids):
+        """
+        Return {post_id: (liked, likes_count)} for the published posts among
+        post_ids, as seen by the user (None for anonymous readers). Entries
+        are briefly cached per (user, post); the misses are read in a single
+        query over the unique (post_id, user_id) index.
+        """
+        states, missing = {}, []
+        for post_id in post_ids:
+            state = post_like_state_cache.get((user_id, post_id))
+            if state is None:
+                missing.append(post_id)
+            elif state:
+                states[post_id] = state
+        if not missing:
+            return states
+
+        query = db.session.query(Post.id, Post.likes_count).filter(
+            Post.id.in_(missing), Post.is_published.is_(True)
+        )
+        if user_id:
+            query = query.outerjoin(
+                Like, db.and_(Like.post_id == Post.id, Like.user_id == user_id)
+            ).add_columns(Like.id.isnot(None))
+        for post_id, likes_count, *liked in query:
+            state = (bool(liked and liked[0]), likes_count)
+            post_like_state_cache.set((user_id, post_id), state)
+            states[post_id] = state
+        # Remember unknown and unpublished ids too, as an empty state
+        for post_id in missing:
+            if post_id not in states:
+                post_like_state_cache.set((user_id, post_id), ())
+        return states
+
+    @staticmethod
+    def forget_state(user_id, post_id):
+        """Drop the user's cached state of a post after a like or unlike"""
+        post_like_state_cache.delete((user_id, post_id))
+
 
 class CommentLike(db.Model):
     __tablename__ = "comment_likes"
@@ -388,11 +1232,61 @@ class CommentLike(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint("comment_id", "user_id", name="unique_comment_like"),
+        # Liked-state lookups start from the user
+        db.Index("ix_comment_likes_user_comment", "user_id", "comment_id"),
     )
 
     def __repr__(self):
         return f"<CommentLike {self.id}>"
 
+    @staticmethod
+    def toggle(comment_id, user_id):
+        """
+        Like or unlike a comment for the user in the current transaction.
+        Returns (liked, likes_count, post_id), or None when the comment does
+        not exist; the caller should roll back in that case.
+        """
+        delta = _toggle_like_row(
+            CommentLike.__table__, "comment_id", comment_id, user_id
+        )
+        row = _shift_likes_count(
+            Comment, comment_id, delta, (Comment.likes_count, Comment.post_id)
+        )
+        if row is None:
+            return None
+        Post.bump_comment_version(row.post_id)
+        return delta > 0, row.likes_count, row.post_id
+
+    @staticmethod
+    def liked_among(user_id, comment_ids):
+        """Return which of comment_ids the user has liked, in one IN query"""
+        comment_ids = list(comment_ids)
+        if not user_id or not comment_ids:
+            return set()
+        return {
+            comment_id
+            for (comment_id,) in db.session.query(CommentLike.comment_id).filter(
+                CommentLike.user_id == user_id,
+                CommentLike.comment_id.in_(comment_ids),
+            )
+        }
+
+    @staticmethod
+    def liked_in_post(user_id, post_id):
+        """
+        Return the ids of the comments on one post that the user has liked,
+        via a post-scoped join. Not cached: the responses that use it are
+        validated by an ETag and must reflect the user's latest like.
+        """
+        if not user_id:
+            return set()
+        return {
+            comment_id
+            for (comment_id,) in db.session.query(CommentLike.comment_id)
+            .join(Comment, Comment.id == CommentLike.comment_id)
+            .filter(CommentLike.user_id == user_id, Comment.post_id == post_id)
+        }
+
 
 class NotificationType:
     """Notification type constants"""
@@ -418,6 +1312,12 @@ class Notification(db.Model):
     is_read = db.Column(db.Boolean, default=False, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        db.Index("ix_notifications_user_read_created", "user_id", "is_read", "created_at"),
+        db.Index("ix_notifications_user_created", "user_id", "created_at", "id"),
+        db.Index("ix_notifications_comment", "comment_id"),
+    )
+
     # Relationships
     user = db.relationship(
         "User",
@@ -480,8 +1380,53 @@ class Notification(db.Model):
 
     @staticmethod
     def get_unread_count(user_id):
-        """Get count of unread notifications for a user"""
-        return Notification.query.filter_by(user_id=user_id, is_read=False).count()
+        """Get count of unread notifications for a user, briefly cached per user"""
+        count = unread_count_cache.get(user_id)
+        if count is None:
+            count = Notification.query.filter_by(user_id=user_id, is_read=False).count()
+            unread_count_cache.set(user_id, count)
+        return count
+
+    @staticmethod
+    def forget_unread_count(user_ids):
+        """Drop cached unread counts after notifications are delivered or read"""
+        for user_id in user_ids:
+            unread_count_cache.delete(user_id)
+
+    @staticmethod
+    def inbox_page(user_id, limit=20, after=None, unread_only=False):
+        """
+        One newest-first page of a user's notifications, with the sender and
+        the post loaded in the same query. after is the (created_at, id) of
+        the last notification on the previous page. Returns (items, has_more).
+        """
+        query = Notification.query.options(
+            joinedload(Notification.from_user),
+            joinedload(Notification.post).load_only(Post.id, Post.slug, Post.title),
+        ).filter(Notification.user_id == user_id)
+        if unread_only:
+            query = query.filter(Notification.is_read.is_(False))
+        if after is not None:
+            query = query.filter(db.tuple_(Notification.created_at, Notification.id) < after)
+        items = (
+            query.order_by(Notification.created_at.desc(), Notification.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        return items[:limit], len(items) > limit
+
+    @staticmethod
+    def mark_read(user_id, notification_ids=None):
+        """
+        Mark the user's unread notifications as read in a single UPDATE; all
+        of them, or only notification_ids. Returns the number marked.
+        """
+        query = Notification.query.filter(
+            Notification.user_id == user_id, Notification.is_read.is_(False)
+        )
+        if notification_ids is not None:
+            query = query.filter(Notification.id.in_(notification_ids))
+        return query.update({"is_read": True}, synchronize_session=False)
 
     @staticmethod
     def get_notifications(user_id, limit=20, include_read=True):
@@ -490,3 +1435,71 @@ class Notification(db.Model):
         if not include_read:
             query = query.filter_by(is_read=False)
         return query.order_by(Notification.created_at.desc()).limit(limit).all()
+
+
+class NotificationEvent(db.Model):
+    """
+    Outbox of notification events. Request handlers add a row in the same
+    transaction as the comment or like that caused it; the notification
+    worker (notifications.py) turns batches of events into notifications.
+    """
+
+    __tablename__ = "notification_outbox"
+
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(20), nullable=False)  # reply, like, mention
+    from_user_id = db.Column(db.Integer, nullable=False)
+    post_id = db.Column(db.Integer, nullable=True)
+    comment_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<NotificationEvent {self.id} - {self.type}>"
+
+    @staticmethod
+    def enqueue(type, from_user_id, post_id=None, comment_id=None):
+        """Queue an event in the current transaction"""
+        db.session.add(
+            NotificationEvent(
+                type=type,
+                from_user_id=from_user_id,
+                post_id=post_id,
+                comment_id=comment_id,
+            )
+        )
+
+    @staticmethod
+    def enqueue_comment(comment):
+        """Queue the reply and mention events of a new comment"""
+        # The events refer to the comment by id
+        db.session.flush()
+        if comment.parent_comment_id:
+            NotificationEvent.enqueue(
+                NotificationType.REPLY, comment.user_id, comment.post_id, comment.id
+            )
+        if "@" in comment.comment:
+            NotificationEvent.enqueue(
+                NotificationType.MENTION, comment.user_id, comment.post_id, comment.id
+            )
+
+
+class SuggestionChange(db.Model):
+    """
+    Shared log of changes to search suggestion labels (published post
+    titles, tag and category names). Admin routes add a row in the same
+    transaction as the change; each worker applies the rows after the last
+    id it has seen to its in-memory SuggestionIndex (search.py). Only the
+    newest SUGGESTION_LOG_SIZE rows are kept.
+    """
+
+    __tablename__ = "suggestion_changes"
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # post, tag, category
+    item_id = db.Column(db.Integer, nullable=False)
+    label = db.Column(db.String(200), nullable=True)  # None: removed
+    slug = db.Column(db.String(250), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<SuggestionChange {self.id} - {self.kind} {self.item_id}>"
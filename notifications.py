@@ -0,0 +1,284 @@
+"""
+Background delivery of notifications.
+
+Request handlers only add a row to the notification_outbox table
+(NotificationEvent.enqueue), in the same transaction as the comment or like
+that caused it, so an event is queued if and only if its cause committed.
+A worker thread polls the outbox every NOTIFICATION_POLL_INTERVAL seconds
+and turns up to NOTIFICATION_BATCH events at a time into notifications:
+
+- reply: the author of the parent comment
+- like: the author of the liked comment
+- mention: every user named as @username in the comment
+
+Each batch is one transaction: claim (delete) the oldest events, resolve
+their comments, actors and mentioned users with one query each, drop
+duplicates, and bulk-insert the notifications. Nobody is notified about
+their own actions, a reply that also mentions the parent's author yields
+only the reply, and repeated events (e.g. like, unlike, like again) do not
+notify twice. Events whose comment was deleted in the meantime are dropped.
+
+The thread is started by the first request a process serves, so scripts
+that only call create_app() never run one. With NOTIFICATION_WORKER off, no
+thread is started and the outbox can be drained by a separate process
+(process_notifications.py). Several workers
+may run at once: claiming a batch deletes it, so each event is delivered
+once.
+"""
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+
+# @username in comment text; usernames may contain dots and dashes inside
+MENTION_RE = re.compile(r"(?<![\w@])@(\w[\w.-]*\w|\w)")
+
+
+def find_mentions(text):
+    """Usernames mentioned in a comment, in order of appearance"""
+    return list(dict.fromkeys(MENTION_RE.findall(text or "")))
+
+
+class NotificationWorker:
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.interval = 1.0
+        self.batch_size = 200
+        self._lock = threading.Lock()
+        self._thread_pid = None
+        self._batches = 0
+        self._events = 0
+        self._delivered = 0
+        self._duplicates = 0
+        self._last_lag = None
+        self._last_run = None
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("NOTIFICATION_WORKER", True)
+        self.interval = app.config.get("NOTIFICATION_POLL_INTERVAL", 1.0)
+        self.batch_size = app.config.get("NOTIFICATION_BATCH", 200)
+        if self.enabled:
+            app.before_request(self.start)
+
+    def start(self):
+        """Start the worker thread once per process (again in a forked worker)"""
+        if not self.enabled or self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        threading.Thread(
+            target=self._run, name="notification-worker", daemon=True
+        ).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.drain()
+            except Exception:
+                self.app.logger.exception("Delivering notifications failed")
+
+    def drain(self):
+        """Process batches until the outbox is empty; returns the events processed"""
+        total = 0
+        with self._lock:
+            while True:
+                with self.app.app_context():
+                    processed = self.process_batch()
+                total += processed
+                if processed < self.batch_size:
+                    return total
+
+    def process_batch(self):
+        """Deliver the oldest batch of queued events in one transaction"""
+        from extensions import db
+        from models import Notification
+
+        events = self._claim()
+        if not events:
+            db.session.rollback()
+            return 0
+        rows, duplicates = self._build(events)
+        if rows:
+            db.session.execute(db.insert(Notification), rows)
+        db.session.commit()
+        Notification.forget_unread_count({row["user_id"] for row in rows})
+
+        now = datetime.utcnow()
+        self._batches += 1
+        self._events += len(events)
+        self._delivered += len(rows)
+        self._duplicates += duplicates
+        self._last_lag = (now - min(event.created_at for event in events)).total_seconds()
+        self._last_run = now
+        return len(events)
+
+    def _claim(self):
+        """Remove the oldest events from the outbox and return them"""
+        from extensions import db
+        from models import NotificationEvent
+
+        table = NotificationEvent.__table__
+        # Most polls find nothing: a read does not take the write lock a
+        # DELETE would, even one matching no rows
+        if db.session.execute(db.select(table.c.id).limit(1)).first() is None:
+            return []
+        oldest = db.select(table.c.id).order_by(table.c.id).limit(self.batch_size)
+        if db.session.get_bind().dialect.delete_returning:
+            return (
+                db.session.execute(
+                    db.delete(table).where(table.c.id.in_(oldest)).returning(*table.c)
+                )
+                .mappings()
+                .all()
+            )
+        events = db.session.execute(db.select(table).where(table.c.id.in_(oldest))).all()
+        if events:
+            db.session.execute(
+                db.delete(table).where(table.c.id.in_([event.id for event in events]))
+            )
+        return [event._mapping for event in events]
+
+    @staticmethod
+    def _build(events):
+        """
+        Resolve the recipients of a batch of events. Returns the notification
+        rows to insert and the number of notifications skipped as duplicates.
+        """
+        from extensions import db
+        from models import Comment, Notification, NotificationType, User
+
+        events = [dict(event) for event in events]
+        comment_ids = {event["comment_id"] for event in events if event["comment_id"]}
+        parent = db.aliased(Comment)
+        comments = {
+            row.id: row
+            for row in db.session.query(
+                Comment.id,
+                Comment.user_id,
+                Comment.post_id,
+                Comment.comment,
+                parent.user_id.label("parent_user_id"),
+            )
+            .outerjoin(parent, parent.id == Comment.parent_comment_id)
+            .filter(Comment.id.in_(comment_ids))
+        }
+
+        mentioned = {}
+        for event in events:
+            comment = comments.get(event["comment_id"])
+            if event["type"] == NotificationType.MENTION and comment:
+                mentioned[event["id"]] = find_mentions(comment.comment)
+        usernames = {name for names in mentioned.values() for name in names}
+        user_ids = {
+            username: user_id
+            for user_id, username in db.session.query(User.id, User.username).filter(
+                User.username.in_(usernames)
+            )
+        } if usernames else {}
+
+        # (recipient, type, actor, comment) of every candidate notification
+        candidates = []
+        for event in events:
+            comment = comments.get(event["comment_id"])
+            if comment is None:
+                continue
+            if event["type"] == NotificationType.REPLY:
+                recipients = [comment.parent_user_id]
+            elif event["type"] == NotificationType.LIKE:
+                recipients = [comment.user_id]
+            elif event["type"] == NotificationType.MENTION:
+                recipients = [user_ids.get(name) for name in mentioned[event["id"]]]
+            else:
+                continue
+            for user_id in recipients:
+                if user_id and user_id != event["from_user_id"]:
+                    candidates.append(
+                        (user_id, event["type"], event["from_user_id"], comment.id)
+                    )
+        if not candidates:
+            return [], 0
+
+        # A mention is redundant next to a reply to the same person
+        replied = {
+            (user_id, comment_id)
+            for user_id, type, _, comment_id in candidates
+            if type == NotificationType.REPLY
+        }
+        existing = set(
+            db.session.query(
+                Notification.user_id,
+                Notification.type,
+                Notification.from_user_id,
+                Notification.comment_id,
+            ).filter(Notification.comment_id.in_({key[3] for key in candidates}))
+        )
+        replied |= {
+            (user_id, comment_id)
+            for user_id, type, _, comment_id in existing
+            if type == NotificationType.REPLY
+        }
+
+        actor_ids = {key[2] for key in candidates}
+        actors = {
+            user_id: full_name or username
+            for user_id, full_name, username in db.session.query(
+                User.id, User.full_name, User.username
+            ).filter(User.id.in_(actor_ids))
+        }
+        messages = {
+            NotificationType.REPLY: "{} replied to your comment",
+            NotificationType.LIKE: "{} liked your comment",
+            NotificationType.MENTION: "{} mentioned you in a comment",
+        }
+
+        rows, seen, duplicates = [], set(), 0
+        for key in candidates:
+            user_id, type, from_user_id, comment_id = key
+            if (
+                key in seen
+                or key in existing
+                or (type == NotificationType.MENTION and (user_id, comment_id) in replied)
+            ):
+                duplicates += 1
+                continue
+            seen.add(key)
+            if from_user_id not in actors:
+                continue
+            rows.append(
+                {
+                    "user_id": user_id,
+                    "type": type,
+                    "message": messages[type].format(actors[from_user_id]),
+                    "from_user_id": from_user_id,
+                    "post_id": comments[comment_id].post_id,
+                    "comment_id": comment_id,
+                    "is_read": False,
+                }
+            )
+        return rows, duplicates
+
+    def metrics(self):
+        """Outbox depth and lag, and counters of this process's deliveries"""
+        from extensions import db
+        from models import NotificationEvent
+
+        depth, oldest = db.session.query(
+            db.func.count(NotificationEvent.id), db.func.min(NotificationEvent.created_at)
+        ).one()
+        return {
+            "enabled": self.enabled,
+            "depth": depth,
+            "lag_seconds": (
+                (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+            ),
+            "last_batch_lag_seconds": self._last_lag,
+            "last_run": self._last_run.isoformat() if self._last_run else None,
+            "batches": self._batches,
+            "events": self._events,
+            "delivered": self._delivered,
+            "duplicates": self._duplicates,
+        }
@@ -0,0 +1,317 @@
+"""
+Full-page cache for anonymous readers.
+
+Whole HTML responses of public GET views are stored under their path and
+query string, together with the version tokens of the dependencies they
+were rendered from ("post:<id>", "listing:all", "listing:category:<id>",
+"listing:tag:<id>", "taxonomy", "taxonomy:counts"). Writes invalidate dependencies, not pages:
+a new token is issued for each dependency once the transaction commits,
+and every page rendered from an old token stops matching.
+
+Requests carrying a session or remember-me cookie (logged-in users, flashed
+messages, anonymous likers) bypass the cache, and responses that modified
+the session are never stored.
+
+Backends (PAGE_CACHE_BACKEND):
+- "memory": per-process LRU with a TTL. Invalidations reach only the worker
+  that made the write; other workers serve their copy until it expires.
+- "filesystem": a directory shared by all workers on the host
+  (PAGE_CACHE_DIR), so invalidations are seen by every worker. Each
+  worker sweeps it now and then, deleting expired pages and then the
+  oldest ones beyond PAGE_CACHE_SIZE.
+A PAGE_CACHE_TTL of 0 disables the page cache.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, request, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+
+
+# Response headers kept with a cached page
+STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Cache-Control")
+
+
+class MemoryPageStore:
+    """Pages in an in-process LRU; dependency tokens in a plain dict"""
+
+    def __init__(self, ttl, size):
+        self._pages = TTLCache("PAGE_CACHE", default_ttl=ttl, default_size=size)
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._pages.get(key)
+
+    def set(self, key, entry):
+        self._pages.set(key, entry)
+
+    def token(self, dependency):
+        return self._tokens.get(dependency)
+
+    def bump(self, dependency):
+        with self._lock:
+            self._tokens[dependency] = uuid.uuid4().hex
+
+    def clear(self):
+        self._pages.clear()
+        with self._lock:
+            self._tokens.clear()
+
+    def stats(self):
+        stats = self._pages.stats()
+        stats["dependencies"] = len(self._tokens)
+        return stats
+
+
+class FileSystemPageStore:
+    """
+    Pages and dependency tokens as small JSON/text files in a directory
+    shared by all workers. Files are replaced atomically.
+
+    Pages are swept every ttl seconds, or after size / 4 writes by this
+    process, so unique URLs cannot grow the directory without bound.
+    """
+
+    def __init__(self, directory, ttl, size):
+        self.directory = directory
+        self.ttl = ttl
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.sweeps = 0
+        self._writes = 0
+        self._next_sweep = time.time() + ttl
+        self._sweep_lock = threading.Lock()
+        os.makedirs(os.path.join(directory, "pages"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "deps"), exist_ok=True)
+
+    def _path(self, kind, name):
+        digest = hashlib.sha1(name.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, kind, digest)
+
+    def _write(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        path = self._path("pages", key)
+        try:
+            with open(path, encoding="utf-8") as handle:
+                expires, entry = json.load(handle)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if expires < time.time():
+            self._remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def set(self, key, entry):
+        self._write(self._path("pages", key), json.dumps([time.time() + self.ttl, entry]))
+        with self._sweep_lock:
+            self._writes += 1
+            due = self._writes >= max(self.size // 4, 1) or time.time() >= self._next_sweep
+            if due:
+                self._writes = 0
+                self._next_sweep = time.time() + self.ttl
+        if due:
+            self.sweep()
+
+    def sweep(self):
+        """Delete expired pages, then the oldest written beyond size"""
+        now = time.time()
+        pages = []
+        for item in os.scandir(os.path.join(self.directory, "pages")):
+            try:
+                written = item.stat().st_mtime
+            except OSError:
+                continue
+            if written + self.ttl < now:
+                # Also a temp file left behind by a killed writer
+                self._remove(item.path)
+            elif not item.name.startswith("."):
+                pages.append((written, item.path))
+        pages.sort()
+        for _, path in pages[: max(len(pages) - self.size, 0)]:
+            self._remove(path)
+        self.sweeps += 1
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def token(self, dependency):
+        try:
+            with open(self._path("deps", dependency), encoding="utf-8") as handle:
+                return handle.read()
+        except OSError:
+            return None
+
+    def bump(self, dependency):
+        self._write(self._path("deps", dependency), uuid.uuid4().hex)
+
+    def clear(self):
+        for kind in ("pages", "deps"):
+            folder = os.path.join(self.directory, kind)
+            for name in os.listdir(folder):
+                self._remove(os.path.join(folder, name))
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(os.listdir(os.path.join(self.directory, "pages"))),
+            "ttl": self.ttl,
+            "sweeps": self.sweeps,
+        }
+
+
+class PageCache:
+    """Flask extension wrapping a page store; see the module docstring"""
+
+    def __init__(self):
+        self.store = None
+
+    def init_app(self, app):
+        ttl = app.config.get("PAGE_CACHE_TTL", 0)
+        backend = app.config.get("PAGE_CACHE_BACKEND", "memory")
+        if ttl <= 0:
+            self.store = None
+        elif backend == "filesystem":
+            directory = app.config.get("PAGE_CACHE_DIR") or os.path.join(
+                app.instance_path, "page_cache"
+            )
+            self.store = FileSystemPageStore(
+                directory, ttl, app.config.get("PAGE_CACHE_SIZE", 512)
+            )
+        elif backend == "memory":
+            self.store = MemoryPageStore(ttl, app.config.get("PAGE_CACHE_SIZE", 512))
+        else:
+            raise ValueError(f"Unknown PAGE_CACHE_BACKEND: {backend}")
+
+    @property
+    def enabled(self):
+        return self.store is not None
+
+    def _bypass(self):
+        """Only anonymous GETs without a session are served from the cache"""
+        if request.method != "GET":
+            return True
+        cookies = (
+            current_app.config.get("SESSION_COOKIE_NAME", "session"),
+            current_app.config.get("REMEMBER_COOKIE_NAME", "remember_token"),
+        )
+        return any(name in request.cookies for name in cookies)
+
+    @staticmethod
+    def _key():
+        args = urlencode(sorted(request.args.items(multi=True)))
+        return f"{request.path}?{args}"
+
+    def cached(self, dependencies):
+        """
+        Decorator for public views. dependencies(**view_kwargs) returns the
+        dependency names the page is rendered from; it only runs on a miss.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or self._bypass():
+                    return view(*args, **kwargs)
+
+                key = self._key()
+                entry = self.store.get(key)
+                if entry is not None and all(
+                    self.store.token(name) == token
+                    for name, token in entry["deps"].items()
+                ):
+                    response = current_app.response_class(
+                        entry["body"], status=entry["status"], headers=entry["headers"]
+                    )
+                    response.headers["X-Page-Cache"] = "HIT"
+                    response.vary.add("Cookie")
+                    # Stored validators still hold: answer 304 where possible
+                    return response.make_conditional(request)
+
+                # Read the tokens before rendering: a write that commits
+                # while the view runs leaves this entry already outdated
+                tokens = {name: self.store.token(name) for name in dependencies(**kwargs)}
+                response = current_app.make_response(view(*args, **kwargs))
+                if (
+                    response.status_code == 200
+                    and not response.direct_passthrough
+                    and not session.modified
+                ):
+                    self.store.set(key, {
+                        "deps": tokens,
+                        "status": response.status_code,
+                        "headers": {
+                            name: response.headers[name]
+                            for name in STORED_HEADERS
+                            if name in response.headers
+                        },
+                        "body": response.get_data(as_text=True),
+                    })
+                response.headers["X-Page-Cache"] = "MISS"
+                response.vary.add("Cookie")
+                return response
+            return wrapper
+        return decorator
+
+    def invalidate(self, *dependencies):
+        """
+        Invalidate dependencies once the current transaction commits (nothing
+        happens if it rolls back).
+        """
+        if not self.enabled:
+            return
+        from extensions import db
+        db.session.info.setdefault("page_cache_dependencies", set()).update(dependencies)
+
+    def bump(self, *dependencies):
+        """Invalidate dependencies right away"""
+        if not self.enabled:
+            return
+        for name in dependencies:
+            self.store.bump(name)
+
+    def clear(self):
+        if self.enabled:
+            self.store.clear()
+
+    def stats(self):
+        if not self.enabled:
+            return {"enabled": False}
+        return self.store.stats()
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_pages(session):
+    from extensions import page_cache
+    dependencies = session.info.pop("page_cache_dependencies", None)
+    if dependencies:
+        page_cache.bump(*dependencies)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_invalidations(session):
+    session.info.pop("page_cache_dependencies", None)
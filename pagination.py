@@ -0,0 +1,113 @@
+"""
+Keyset (cursor) pagination for newest-first listings.
+
+KeysetPagination exposes the same attributes the templates use from
+Flask-SQLAlchemy's Pagination (items, page, pages, has_prev/has_next,
+prev_num/next_num, iter_pages) so numbered page links keep working. Previous
+and next links also carry a cursor for the (created_at, id) position, and
+pages reached that way are read with an indexed range scan instead of an
+OFFSET. Jumping straight to a numbered page falls back to OFFSET. The total is
+passed in (from a stored counter) rather than counted per request.
+"""
+from math import ceil
+
+from sqlalchemy import tuple_
+
+from utils import encode_cursor
+
+
+class KeysetPagination:
+    def __init__(self, query, created_column, id_column, page=1, per_page=20,
+                 total=None, after=None, before=None):
+        """
+        after/before are decoded cursors (created_at, id): the page starts
+        right after the last item of the previous page, or ends right before
+        the first item of the next one. total=None counts the query.
+        """
+        self.page = max(page, 1)
+        self.per_page = per_page
+        self.total = query.order_by(None).count() if total is None else total
+        self._created_key = created_column.key
+        self._id_key = id_column.key
+
+        position = tuple_(created_column, id_column)
+        newest_first = (created_column.desc(), id_column.desc())
+        if after is not None:
+            rows = (
+                query.filter(position < tuple_(*after))
+                .order_by(*newest_first)
+                .limit(per_page + 1)
+                .all()
+            )
+            has_next = len(rows) > per_page
+        elif before is not None:
+            rows = (
+                query.filter(position > tuple_(*before))
+                .order_by(created_column.asc(), id_column.asc())
+                .limit(per_page)
+                .all()
+            )
+            rows.reverse()
+            # The item the cursor points at is still ahead of this page
+            has_next = True
+        else:
+            rows = (
+                query.order_by(*newest_first)
+                .offset((self.page - 1) * per_page)
+                .limit(per_page + 1)
+                .all()
+            )
+            has_next = len(rows) > per_page
+        self.items = rows[:per_page]
+        self.has_next = has_next
+        self.has_prev = self.page > 1
+
+        self.pages = ceil(self.total / per_page) if per_page else 0
+        if self.has_next and self.pages <= self.page:
+            # The stored total lags behind the rows; never hide the next page
+            self.pages = self.page + 1
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+    def _cursor(self, item):
+        return encode_cursor(getattr(item, self._created_key), getattr(item, self._id_key))
+
+    @property
+    def prev_cursor(self):
+        """Cursor for the previous page link (None on the first page)"""
+        return self._cursor(self.items[0]) if self.has_prev and self.items else None
+
+    @property
+    def next_cursor(self):
+        """Cursor for the next page link (None on the last page)"""
+        return self._cursor(self.items[-1]) if self.has_next and self.items else None
+
+    def iter_pages(self, *, left_edge=2, left_current=2, right_current=4, right_edge=2):
+        """Page numbers for numbered links, with None for skipped ranges"""
+        pages_end = self.pages + 1
+        if pages_end == 1:
+            return
+
+        left_end = min(1 + left_edge, pages_end)
+        yield from range(1, left_end)
+        if left_end == pages_end:
+            return
+
+        mid_start = max(left_end, self.page - left_current)
+        mid_end = min(self.page + right_current + 1, pages_end)
+        if mid_start - left_end > 0:
+            yield None
+        yield from range(mid_start, mid_end)
+        if mid_end == pages_end:
+            return
+
+        right_start = max(mid_end, pages_end - right_edge)
+        if right_start - mid_end > 0:
+            yield None
+        yield from range(right_start, pages_end)
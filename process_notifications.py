@@ -0,0 +1,46 @@
+"""
+Deliver queued notifications from the notification_outbox table.
+
+The web workers deliver notifications from a background thread. Deployments
+that set NOTIFICATION_WORKER=0 run this script instead, either once (e.g.
+from cron) or continuously:
+    python process_notifications.py
+    python process_notifications.py --watch
+"""
+
+import os
+import sys
+import time
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from extensions import notification_worker
+
+# Create the app
+app = create_app()
+
+
+def process(watch=False):
+    """Drain the outbox; with watch, keep polling for new events."""
+    while True:
+        processed = notification_worker.drain()
+        if processed:
+            print(f"Processed {processed} notification events")
+        if not watch:
+            break
+        time.sleep(notification_worker.interval)
+    with app.app_context():
+        metrics = notification_worker.metrics()
+    print(f"Outbox depth: {metrics['depth']}, delivered: {metrics['delivered']}, "
+          f"duplicates skipped: {metrics['duplicates']}")
+
+
+if __name__ == '__main__':
+    print("=== Processing Notification Outbox ===\n")
+    try:
+        process(watch='--watch' in sys.argv)
+    except KeyboardInterrupt:
+        pass
+    print("\n=== Done! ===")
@@ -0,0 +1,36 @@
+"""
+Maintenance script to rebuild the full-text search index (posts_fts).
+Re-indexes every published post from scratch, e.g. after bulk imports or
+direct database edits that bypassed the admin routes.
+
+Run it whenever search results look out of date (safe to re-run):
+    python rebuild_search_index.py
+"""
+
+import os
+import sys
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from search import rebuild_search_index, search_available
+
+# Create the app
+app = create_app()
+
+
+def rebuild():
+    """Rebuild the FTS5 index from the posts table."""
+    with app.app_context():
+        if not search_available():
+            print("Full-text search needs SQLite; nothing to rebuild.")
+            return
+        indexed = rebuild_search_index()
+        print(f"Indexed {indexed} published posts")
+
+
+if __name__ == '__main__':
+    print("=== Starting Search Index Rebuild ===\n")
+    rebuild()
+    print("\n=== Rebuild completed! ===")
@@ -0,0 +1,34 @@
+"""
+Maintenance script to repair the denormalized like/comment/reply counters.
+Recomputes posts.likes_count, posts.comments_count, comments.likes_count,
+comments.replies_count and the published post totals (categories.post_count,
+tags.post_count, site_counters) from the underlying rows and fixes any drift.
+
+Run it whenever the counters are suspected to be off (safe to re-run):
+    python recount_counters.py
+"""
+
+import os
+import sys
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import recount_counters
+
+# Create the app
+app = create_app()
+
+
+def repair_counters():
+    """Recount every stored counter and report how many rows drifted."""
+    with app.app_context():
+        fixed = recount_counters()
+        print(f"Counters repaired: {fixed} rows were out of date")
+
+
+if __name__ == '__main__':
+    print("=== Starting Counter Recount ===\n")
+    repair_counters()
+    print("\n=== Recount completed! ===")
@@ -0,0 +1,435 @@
+"""
+Full-text search over published posts, backed by an SQLite FTS5 table.
+
+posts_fts holds one row per published post (rowid = post id) with the title,
+plain-text body, tag names and category name. Admin routes keep it in sync
+in the same transaction as the post change; rebuild_search_index() recreates
+it from scratch. On other databases search falls back to LIKE filters.
+
+SuggestionIndex answers search-as-you-type from memory without the database.
+Admin routes log label changes in the suggestion_changes table
+(touch_suggestions()), and get_suggestions() applies new log rows to each
+worker's index incrementally.
+"""
+import base64
+import bisect
+import re
+import threading
+import time
+
+from markupsafe import Markup, escape
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from models import Post, Category, Tag, SuggestionChange
+from utils import html_to_text
+
+# Column weights for bm25(): title, body, tags, category
+RANK_WEIGHTS = (10.0, 1.0, 4.0, 2.0)
+
+# Control characters mark matches inside snippets; they do not occur in the
+# indexed text, so highlighting is applied after HTML-escaping the snippet
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+SNIPPET_TOKENS = 24
+
+
+def search_available():
+    """FTS5 is only used on SQLite"""
+    return db.engine.dialect.name == "sqlite"
+
+
+def create_search_index():
+    """Create the FTS5 table if it does not exist yet"""
+    db.session.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5("
+        "title, body, tags, category, tokenize='unicode61 remove_diacritics 2')"
+    ))
+
+
+def _document(post):
+    """Column values of the index row for a post"""
+    category = db.session.get(Category, post.category_id) if post.category_id else None
+    return {
+        "id": post.id,
+        "title": post.title,
+        "body": html_to_text(post.content),
+        "tags": " ".join(tag.name for tag in post.tags),
+        "category": category.name if category else "",
+    }
+
+
+def remove_post(post_id):
+    """Drop a post from the index (no-op if it is not indexed)"""
+    if not search_available():
+        return
+    db.session.execute(text("DELETE FROM posts_fts WHERE rowid = :id"), {"id": post_id})
+
+
+def index_post(post):
+    """
+    (Re)index a post in the current transaction. Unpublished posts are
+    removed so the index only ever matches what readers can see.
+    """
+    if not search_available():
+        return
+    db.session.flush()
+    remove_post(post.id)
+    if post.is_published:
+        db.session.execute(
+            text(
+                "INSERT INTO posts_fts (rowid, title, body, tags, category) "
+                "VALUES (:id, :title, :body, :tags, :category)"
+            ),
+            _document(post),
+        )
+
+
+def rebuild_search_index(batch_size=200):
+    """Recreate the index from every published post; returns posts indexed"""
+    create_search_index()
+    db.session.execute(text("DELETE FROM posts_fts"))
+
+    indexed = 0
+    query = Post.query.filter_by(is_published=True).order_by(Post.id)
+    for post in query.yield_per(batch_size):
+        db.session.execute(
+            text(
+                "INSERT INTO posts_fts (rowid, title, body, tags, category) "
+                "VALUES (:id, :title, :body, :tags, :category)"
+            ),
+            _document(post),
+        )
+        indexed += 1
+    db.session.commit()
+    return indexed
+
+
+def build_match_query(search):
+    """
+    Turn free-form user input into a safe FTS5 MATCH expression: every word
+    must match, as a prefix. Returns None if there is nothing to search for.
+    """
+    terms = re.findall(r"\w+", search, re.UNICODE)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _search_hits(search):
+    """
+    Selectable of (post_id, rank, snippet) for posts matching search; lower
+    rank is better. Snippets come from the body column with matches wrapped
+    in SNIPPET_START/SNIPPET_END (see highlight_snippet).
+    """
+    if not search_available():
+        # No index: every LIKE match ranks the same and has no snippet
+        return (
+            db.select(
+                Post.id.label("post_id"),
+                db.literal(0.0, db.Float).label("rank"),
+                db.null().label("snippet"),
+            )
+            .where(db.or_(Post.title.ilike(f"%{search}%"), Post.content.ilike(f"%{search}%")))
+            .subquery("search_hits")
+        )
+
+    match = build_match_query(search)
+    if match is None:
+        # Nothing searchable in the input: an empty result with the same shape
+        match = '""'
+
+    return (
+        text(
+            "SELECT rowid AS post_id, bm25(posts_fts, {weights}) AS rank, "
+            "snippet(posts_fts, 1, :start, :end, :ellipsis, :tokens) AS snippet "
+            "FROM posts_fts WHERE posts_fts MATCH :match".format(
+                weights=", ".join(str(weight) for weight in RANK_WEIGHTS)
+            )
+        )
+        .bindparams(
+            match=match,
+            start=SNIPPET_START,
+            end=SNIPPET_END,
+            ellipsis="\u2026",
+            tokens=SNIPPET_TOKENS,
+        )
+        .columns(post_id=db.Integer, rank=db.Float, snippet=db.Text)
+        .subquery("search_hits")
+    )
+
+
+def search_posts(query, search):
+    """
+    Restrict a Post query to posts matching search, best matches first
+    (newest first among equal ranks). Each row is (Post, snippet).
+    """
+    hits = _search_hits(search)
+    return (
+        query.join(hits, hits.c.post_id == Post.id)
+        .add_columns(hits.c.snippet)
+        .order_by(hits.c.rank, Post.id.desc())
+    )
+
+
+def search_page(search, limit, after=None):
+    """
+    One page of ranked search hits for the JSON API.
+
+    after is a decoded cursor (rank, post_id) from the previous page.
+    Returns ([(post, rank, snippet)], has_more, total).
+    """
+    hits = _search_hits(search)
+    query = (
+        db.session.query(Post, hits.c.rank, hits.c.snippet)
+        .join(hits, hits.c.post_id == Post.id)
+        .options(joinedload(Post.category))
+        .filter(Post.is_published.is_(True))
+    )
+    total = query.order_by(None).count()
+
+    if after is not None:
+        rank, post_id = after
+        query = query.filter(
+            db.or_(hits.c.rank > rank, db.and_(hits.c.rank == rank, Post.id < post_id))
+        )
+    rows = query.order_by(hits.c.rank, Post.id.desc()).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit, total
+
+
+def highlight_snippet(snippet):
+    """Escape a raw index snippet and turn its match markers into <mark> tags"""
+    if not snippet:
+        return None
+    escaped = str(escape(snippet))
+    return Markup(escaped.replace(SNIPPET_START, "<mark>").replace(SNIPPET_END, "</mark>"))
+
+
+def encode_search_cursor(rank, post_id):
+    """Encode a (rank, post id) search position as an opaque URL-safe token"""
+    raw = f"{rank!r}|{post_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_search_cursor(token):
+    """Decode a search cursor back to (rank, post id); None if it is invalid"""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        rank, post_id = raw.rsplit("|", 1)
+        return float(rank), int(post_id)
+    except (ValueError, UnicodeError):
+        return None
+
+
+class SuggestionIndex:
+    """
+    In-memory prefix index for search-as-you-type over published post titles,
+    tag names and category names.
+
+    Entries are (key, kind, id) tuples in one sorted list, where key is the
+    normalized label and every word-suffix of it (so "tuning sqlite" is found
+    by "sq" too). A lookup is a bisect to the first key with the prefix and a
+    short forward scan.
+
+    version is the id of the last suggestion_changes row reflected in the
+    index. refresh() applies newer rows with add()/remove(); it rebuilds
+    from scratch only on first use or when rows it has not seen were
+    already trimmed from the log. Building happens outside the lock that
+    lookups take, so suggestions keep being served meanwhile.
+    """
+
+    def __init__(self):
+        self.poll = 2
+        self.log_size = 1000
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.loads = 0
+        self.changes_applied = 0
+        self.clear()
+
+    def init_app(self, app):
+        self.poll = app.config.get("SUGGESTION_POLL", self.poll)
+        self.log_size = app.config.get("SUGGESTION_LOG_SIZE", self.log_size)
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._items = {}
+        self._next_check = 0.0
+        self.version = None
+
+    @staticmethod
+    def normalize(value):
+        return " ".join(value.casefold().split())
+
+    @classmethod
+    def _keys(cls, label):
+        words = cls.normalize(label).split(" ")
+        return [" ".join(words[i:]) for i in range(len(words)) if words[i]]
+
+    def __len__(self):
+        return len(self._items)
+
+    def load(self):
+        """Build the index from the database, replacing what it held"""
+        # Read the log position first: changes committed while the items are
+        # read are applied again by the next refresh, which is harmless
+        version = db.session.query(db.func.max(SuggestionChange.id)).scalar() or 0
+        items = {}
+        posts = db.session.query(Post.id, Post.title, Post.slug).filter(Post.is_published.is_(True))
+        for post_id, title, slug in posts:
+            items[("post", post_id)] = (title, slug)
+        for tag_id, name in db.session.query(Tag.id, Tag.name):
+            items[("tag", tag_id)] = (name, None)
+        for category_id, name in db.session.query(Category.id, Category.name):
+            items[("category", category_id)] = (name, None)
+
+        entries = sorted(
+            (key, kind, item_id)
+            for (kind, item_id), (label, _) in items.items()
+            for key in self._keys(label)
+        )
+        with self._lock:
+            self._entries = entries
+            self._items = items
+        self.version = version
+        self.loads += 1
+
+    def refresh(self):
+        """
+        Catch up with the change log, at most once every poll seconds. Only
+        one thread refreshes at a time; the others keep using the index as
+        it is, unless it has never been built.
+        """
+        if time.monotonic() < self._next_check:
+            return
+        if not self._refresh_lock.acquire(blocking=self.version is None):
+            return
+        try:
+            if time.monotonic() < self._next_check:
+                return
+            if self.version is None:
+                self.load()
+            else:
+                changes = (
+                    db.session.query(
+                        SuggestionChange.id,
+                        SuggestionChange.kind,
+                        SuggestionChange.item_id,
+                        SuggestionChange.label,
+                        SuggestionChange.slug,
+                    )
+                    .filter(SuggestionChange.id > self.version)
+                    .order_by(SuggestionChange.id)
+                    .all()
+                )
+                oldest = db.session.query(db.func.min(SuggestionChange.id)).scalar()
+                if changes and oldest > self.version + 1:
+                    # Rows this index never saw have been trimmed
+                    self.load()
+                else:
+                    for _, kind, item_id, label, slug in changes:
+                        if label is None:
+                            self.remove(kind, item_id)
+                        else:
+                            self.add(kind, item_id, label, slug)
+                    if changes:
+                        self.version = changes[-1].id
+                        self.changes_applied += len(changes)
+            self._next_check = time.monotonic() + self.poll
+        finally:
+            self._refresh_lock.release()
+
+    def expire(self):
+        """Catch up on the next refresh() (after a local write)"""
+        self._next_check = 0.0
+
+    def stats(self):
+        return {
+            "items": len(self),
+            "version": self.version,
+            "loads": self.loads,
+            "changes_applied": self.changes_applied,
+        }
+
+    def add(self, kind, item_id, label, slug=None):
+        """Add or replace one item"""
+        with self._lock:
+            self._discard(kind, item_id)
+            self._items[(kind, item_id)] = (label, slug)
+            for key in self._keys(label):
+                bisect.insort(self._entries, (key, kind, item_id))
+
+    def remove(self, kind, item_id):
+        """Remove one item (no-op if it is not indexed)"""
+        with self._lock:
+            self._discard(kind, item_id)
+
+    def _discard(self, kind, item_id):
+        item = self._items.pop((kind, item_id), None)
+        if item is None:
+            return
+        for key in self._keys(item[0]):
+            entry = (key, kind, item_id)
+            position = bisect.bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+
+    def suggest(self, prefix, limit=8):
+        """Up to limit (kind, id, label, slug) items with a word starting with prefix"""
+        prefix = self.normalize(prefix)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect.bisect_left(self._entries, (prefix,))
+            while position < len(self._entries) and len(results) < limit:
+                key, kind, item_id = self._entries[position]
+                if not key.startswith(prefix):
+                    break
+                if (kind, item_id) not in seen:
+                    seen.add((kind, item_id))
+                    label, slug = self._items[(kind, item_id)]
+                    results.append((kind, item_id, label, slug))
+                position += 1
+        return results
+
+
+suggestions = SuggestionIndex()
+
+
+def get_suggestions():
+    """This worker's suggestion index, caught up with the shared change log"""
+    suggestions.refresh()
+    return suggestions
+
+
+def touch_suggestions(kind, item_id, label=None, slug=None):
+    """
+    Log a suggestion change in the current transaction: label is the item's
+    new label, or None when it stops being suggested. Trims the log to the
+    newest SUGGESTION_LOG_SIZE rows.
+    """
+    change = SuggestionChange(kind=kind, item_id=item_id, label=label, slug=slug)
+    db.session.add(change)
+    db.session.flush()
+    db.session.execute(
+        db.delete(SuggestionChange).where(
+            SuggestionChange.id <= change.id - suggestions.log_size
+        )
+    )
+    suggestions.expire()
+
+
+def touch_post_suggestion(post):
+    """Log a post's current title, or its removal if it is not published"""
+    db.session.flush()
+    touch_suggestions(
+        "post", post.id, post.title if post.is_published else None, post.slug
+    )
@@ -34,4 +34,41 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
+// Hydrate the liked state and like counts of post cards in one request
+document.addEventListener('DOMContentLoaded', function() {
+    if (!document.body.hasAttribute('data-signed-in')) {
+        return;
+    }
+    const cards = document.querySelectorAll('[data-like-state][data-post-id]');
+    if (!cards.length) {
+        return;
+    }
+    const postIds = Array.from(new Set(Array.from(cards, function(card) {
+        return card.getAttribute('data-post-id');
+    }))).slice(0, 100);
 
+    fetch('/api/likes/state?post_ids=' + postIds.join(','), {
+        credentials: 'same-origin',
+        headers: { 'Accept': 'application/json' }
+    })
+        .then(function(response) {
+            return response.ok ? response.json() : null;
+        })
+        .then(function(data) {
+            if (!data || !data.success) {
+                return;
+            }
+            cards.forEach(function(card) {
+                const state = data.states[card.getAttribute('data-post-id')];
+                if (!state) {
+                    return;
+                }
+                card.querySelector('.likes-count').textContent = state.likes_count;
+                const icon = card.querySelector('.fa-heart');
+                icon.classList.toggle('fas', state.liked);
+                icon.classList.toggle('far', !state.liked);
+                card.title = state.liked ? 'You liked this post' : '';
+            });
+        })
+        .catch(function() {});
+});
@@ -0,0 +1,133 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import Config
+from extensions import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on a fresh SQLite database, with background threads off"""
+
+    class TestConfig(Config):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        UPLOAD_FOLDER = tmp_path / "uploads"
+        PAGE_CACHE_TTL = 0
+        LIKE_WRITE_BEHIND = False
+        NOTIFICATION_WORKER = False
+
+    app = create_app(TestConfig)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, user_id):
+    """Sign a test client in as the given user"""
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+        session["user_type"] = "user"
+
+
+class QueryCounter:
+    """Records the SQL statements run on the engine while active"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __enter__(self):
+        event.listen(db.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(db.engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, parameters))
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+def make_users(count, prefix="user"):
+    from models import User
+
+    users = [
+        User(
+            username=f"{prefix}{i}",
+            email=f"{prefix}{i}@example.com",
+            password_hash="x",
+            full_name=f"User {i}",
+        )
+        for i in range(count)
+    ]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+
+def make_post(title="Hello world", slug=None, category=None, tags=(), published=True):
+    from models import Post
+
+    post = Post(
+        title=title,
+        slug=slug or title.lower().replace(" ", "-"),
+        content=f"<p>{title} body text</p>",
+        is_published=published,
+        category=category,
+    )
+    post.tags = list(tags)
+    post.refresh_text_stats()
+    db.session.add(post)
+    db.session.commit()
+    return post
+
+
+def make_comment_tree(post, users, count, seed=1):
+    """
+    Add count comments to post as a random tree (about a third top-level),
+    with distinct timestamps and some likes, then recount the counters.
+    """
+    import random
+
+    from models import Comment, CommentLike, recount_counters
+
+    rnd = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    comments = []
+    for i in range(count):
+        parent = rnd.choice(comments) if comments and rnd.random() < 0.65 else None
+        comment = Comment(
+            post_id=post.id,
+            user_id=rnd.choice(users).id,
+            comment=f"comment {i}",
+            parent_comment_id=parent.id if parent else None,
+            created_at=start + timedelta(seconds=i),
+        )
+        db.session.add(comment)
+        db.session.flush()
+        comments.append(comment)
+    for comment in comments:
+        for user in users:
+            if rnd.random() < 0.2:
+                db.session.add(CommentLike(comment_id=comment.id, user_id=user.id))
+    db.session.commit()
+    recount_counters()
+    return comments
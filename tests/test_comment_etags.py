@@ -0,0 +1,70 @@
+import pytest
+
+from conftest import login, make_comment_tree, make_post, make_users
+from extensions import db
+
+
+def like_from_another_worker(app, user_id, comment):
+    """Like a comment the way another worker would: this worker's cache is not told"""
+    from models import CommentLike, Post
+
+    with app.app_context():
+        db.session.add(CommentLike(comment_id=comment["id"], user_id=user_id))
+        Post.bump_comment_version(comment["post_id"])
+        db.session.commit()
+
+
+def find(comments, comment_id):
+    for comment in comments:
+        if comment["id"] == comment_id:
+            return comment
+        found = find(comment["replies"], comment_id)
+        if found:
+            return found
+
+
+@pytest.fixture
+def thread(app):
+    from models import CommentLike
+
+    with app.app_context():
+        users = make_users(2)
+        post = make_post()
+        comments = make_comment_tree(post, users[1:], 10)
+        CommentLike.query.delete()
+        db.session.commit()
+        top = next(c for c in comments if c.parent_comment_id is None)
+        reply = next(c for c in comments if c.parent_comment_id == top.id)
+        return {
+            "user_id": users[0].id,
+            "post_id": post.id,
+            "top": {"id": top.id, "post_id": post.id},
+            "reply": {"id": reply.id, "post_id": post.id},
+        }
+
+
+def test_tree_etag_carries_likes_made_on_another_worker(app, client, thread):
+    login(client, thread["user_id"])
+    url = f"/api/post/{thread['post_id']}/comments"
+    first = client.get(url)
+    assert not find(first.get_json()["comments"], thread["top"]["id"])["is_liked"]
+
+    like_from_another_worker(app, thread["user_id"], thread["top"])
+    fresh = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+
+    assert fresh.status_code == 200
+    assert find(fresh.get_json()["comments"], thread["top"]["id"])["is_liked"]
+    again = client.get(url, headers={"If-None-Match": fresh.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_replies_etag_carries_likes_made_on_another_worker(app, client, thread):
+    login(client, thread["user_id"])
+    url = f"/api/comment/{thread['top']['id']}/replies"
+    first = client.get(url)
+
+    like_from_another_worker(app, thread["user_id"], thread["reply"])
+    fresh = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+
+    assert fresh.status_code == 200
+    assert find(fresh.get_json()["replies"], thread["reply"]["id"])["is_liked"]
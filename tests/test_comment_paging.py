@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import make_post, make_users
+from extensions import db
+
+
+@pytest.fixture
+def parent_id(app):
+    """A comment with 12 direct replies at distinct times"""
+    from models import Comment
+
+    with app.app_context():
+        user = make_users(1)[0]
+        post = make_post()
+        start = datetime(2024, 1, 1)
+        parent = Comment(post_id=post.id, user_id=user.id, comment="parent", created_at=start)
+        db.session.add(parent)
+        db.session.flush()
+        for i in range(12):
+            db.session.add(
+                Comment(
+                    post_id=post.id,
+                    user_id=user.id,
+                    comment=f"reply {i}",
+                    parent_comment_id=parent.id,
+                    created_at=start + timedelta(minutes=i + 1),
+                )
+            )
+        db.session.commit()
+        return parent.id
+
+
+def reply_pages(client, url, next_param):
+    pages, param = [], ""
+    while True:
+        assert len(pages) < 10, "paging never ends"
+        data = client.get(url + param).get_json()
+        pages.append([reply["content"] for reply in data["replies"]])
+        if not data["has_more"]:
+            return pages
+        param = next_param(data, sum(len(page) for page in pages))
+
+
+def test_replies_page_by_cursor(client, parent_id):
+    pages = reply_pages(
+        client,
+        f"/api/comment/{parent_id}/replies?limit=5",
+        lambda data, seen: f"&cursor={data['next_cursor']}",
+    )
+    assert pages == [
+        [f"reply {i}" for i in range(0, 5)],
+        [f"reply {i}" for i in range(5, 10)],
+        [f"reply {i}" for i in range(10, 12)],
+    ]
+
+
+def test_replies_still_page_by_offset(client, parent_id):
+    by_cursor = reply_pages(
+        client,
+        f"/api/comment/{parent_id}/replies?limit=5",
+        lambda data, seen: f"&cursor={data['next_cursor']}",
+    )
+    by_offset = reply_pages(
+        client,
+        f"/api/comment/{parent_id}/replies?limit=5",
+        lambda data, seen: f"&offset={seen}",
+    )
+    assert by_offset == by_cursor
+
+
+def test_cursor_wins_over_offset(client, parent_id):
+    url = f"/api/comment/{parent_id}/replies?limit=5"
+    cursor = client.get(url).get_json()["next_cursor"]
+    data = client.get(f"{url}&cursor={cursor}&offset=10").get_json()
+    assert [reply["content"] for reply in data["replies"]][0] == "reply 5"
+
+
+@pytest.mark.parametrize("query", ["", "&stream=1"])
+def test_negative_max_depth_returns_top_level_comments(client, parent_id, query):
+    from models import Comment
+
+    with client.application.app_context():
+        post_id = db.session.get(Comment, parent_id).post_id
+
+    data = client.get(f"/api/post/{post_id}/comments?limit=1&max_depth=-1{query}")
+    assert data.status_code == 200
+    comments = data.get_json()["comments"]
+    assert [comment["content"] for comment in comments] == ["parent"]
+    assert comments[0]["replies"] == []
+
+
+def test_negative_max_depth_on_replies(client, parent_id):
+    response = client.get(f"/api/comment/{parent_id}/replies?limit=1&max_depth=-1")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [reply["content"] for reply in data["replies"]] == ["reply 0"]
+    assert data["has_more"]
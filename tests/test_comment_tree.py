@@ -0,0 +1,86 @@
+import pytest
+
+from conftest import QueryCounter, login, make_comment_tree, make_post, make_users
+from extensions import db
+
+
+def recursive_tree(post_id, max_depth, user_liked_ids):
+    """
+    The comment tree as the original recursive Comment.to_dict built it: one
+    query per comment, counters recomputed from the child rows.
+    """
+    from models import Comment, CommentLike
+
+    def to_dict(comment, depth):
+        replies_count = Comment.query.filter_by(parent_comment_id=comment.id).count()
+        data = {
+            "id": comment.id,
+            "post_id": comment.post_id,
+            "parent_comment_id": comment.parent_comment_id,
+            "user_id": comment.user_id,
+            "content": comment.comment,
+            "image": comment.image,
+            "author": comment.display_name,
+            "created_at": comment.created_at.isoformat(),
+            "likes_count": CommentLike.query.filter_by(comment_id=comment.id).count(),
+            "replies_count": replies_count,
+            "is_liked": comment.id in user_liked_ids,
+            "depth": depth,
+        }
+        if depth < max_depth:
+            replies = Comment.query.filter_by(parent_comment_id=comment.id).order_by(
+                Comment.created_at.asc()
+            )
+            data["replies"] = [to_dict(reply, depth + 1) for reply in replies]
+        else:
+            data["replies"] = []
+            data["has_more_replies"] = replies_count > 0
+        return data
+
+    top_level = Comment.query.filter_by(post_id=post_id, parent_comment_id=None).order_by(
+        Comment.created_at.desc()
+    )
+    return [to_dict(comment, 0) for comment in top_level]
+
+
+def count_tree_queries(client, post_id):
+    with QueryCounter() as counter:
+        response = client.get(f"/api/post/{post_id}/comments")
+    assert response.status_code == 200
+    return counter.count
+
+
+@pytest.mark.parametrize("signed_in", [False, True])
+def test_query_count_does_not_grow_with_tree_size(app, client, signed_in):
+    with app.app_context():
+        users = make_users(5)
+        small = make_post("Small thread")
+        large = make_post("Large thread")
+        make_comment_tree(small, users, 20)
+        make_comment_tree(large, users, 600, seed=2)
+        if signed_in:
+            login(client, users[0].id)
+
+        assert count_tree_queries(client, small.id) == count_tree_queries(client, large.id)
+
+
+@pytest.mark.parametrize("max_depth", [10, 2, 0])
+def test_tree_matches_recursive_output(app, client, max_depth):
+    from models import CommentLike
+
+    with app.app_context():
+        users = make_users(4)
+        post = make_post()
+        make_comment_tree(post, users, 150)
+        login(client, users[1].id)
+        liked = {
+            like.comment_id for like in CommentLike.query.filter_by(user_id=users[1].id)
+        }
+        expected = recursive_tree(post.id, max_depth, liked)
+        post_id = post.id
+
+    response = client.get(f"/api/post/{post_id}/comments?max_depth={max_depth}")
+
+    assert response.status_code == 200
+    assert response.get_json()["comments"] == expected
+
@@ -0,0 +1,77 @@
+import time
+
+from conftest import login, make_post, make_users
+from extensions import db
+
+
+def test_post_page_revalidates_with_304(app, client):
+    with app.app_context():
+        user_id = make_users(1)[0].id
+        slug = make_post().slug
+    login(client, user_id)
+
+    first = client.get(f"/post/{slug}")
+    again = client.get(f"/post/{slug}", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert first.status_code == 200
+    assert again.status_code == 304
+
+
+def test_pending_flash_is_rendered_instead_of_304(app, client):
+    with app.app_context():
+        user_id = make_users(1)[0].id
+        post = make_post()
+        post_id, slug = post.id, post.slug
+    login(client, user_id)
+    etag = client.get(f"/post/{slug}").headers["ETag"]
+
+    # An empty comment flashes a validation error and redirects to the post
+    redirect = client.post(f"/post/{post_id}/comment", data={"comment": ""})
+    assert redirect.status_code == 302
+    page = client.get(f"/post/{slug}", headers={"If-None-Match": etag})
+
+    assert page.status_code == 200
+    assert "ETag" not in page.headers
+    assert b"alert-danger" in page.data
+    # Once shown, the flash is gone and the page validates again
+    assert client.get(f"/post/{slug}", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_signed_in_etag_moves_with_the_csrf_token_window(app, client):
+    with app.app_context():
+        user_id = make_users(1)[0].id
+        slug = make_post().slug
+    login(client, user_id)
+    app.config["WTF_CSRF_TIME_LIMIT"] = 2
+
+    first = client.get(f"/post/{slug}")
+    etag = client.get(f"/post/{slug}").headers["ETag"]
+    time.sleep(1.1)
+    later = client.get(f"/post/{slug}", headers={"If-None-Match": etag})
+
+    assert first.status_code == 200
+    # A fresh page, with a fresh token, instead of a 304
+    assert later.status_code == 200
+    assert later.headers["ETag"] != etag
+
+
+def test_pages_are_validated_by_etag_only(app, client):
+    from models import Like, Post
+
+    with app.app_context():
+        user_id = make_users(1)[0].id
+        post = make_post()
+        post_id, slug = post.id, post.slug
+    first = client.get(f"/post/{slug}")
+    assert "Last-Modified" not in first.headers
+
+    # A like moves no timestamp, so a date could not tell the page changed
+    with app.app_context():
+        db.session.add(Like(post_id=post_id, user_id=user_id))
+        Post.adjust_counters(post_id, likes=1)
+        db.session.commit()
+    since = client.get(f"/post/{slug}", headers={"If-Modified-Since": "Sat, 01 Jan 2050 00:00:00 GMT"})
+    tagged = client.get(f"/post/{slug}", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert since.status_code == 200
+    assert tagged.status_code == 200
@@ -0,0 +1,190 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+from sqlalchemy import event
+
+from conftest import make_post, make_users
+from extensions import db, like_buffer
+
+
+@pytest.fixture
+def buffer(app):
+    """The like buffer switched on, with its flusher thread kept idle"""
+    app.config["LIKE_WRITE_BEHIND"] = True
+    app.config["LIKE_FLUSH_INTERVAL"] = 3600
+    like_buffer.init_app(app)
+    yield like_buffer
+    like_buffer.enabled = False
+    like_buffer._pending.clear()
+    like_buffer._deltas.clear()
+
+
+class FlushBeforeNextLock:
+    """Wraps the buffer's lock to run a flush, from another thread, right
+    before the lock is next taken once armed"""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.lock = buffer._lock
+        self.armed = False
+
+    def __enter__(self):
+        if self.armed:
+            self.armed = False
+            flusher = threading.Thread(target=self.buffer.flush)
+            flusher.start()
+            flusher.join()
+        return self.lock.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.lock.__exit__(*exc_info)
+
+
+def stored(post_id, user_id):
+    from models import Like, Post
+
+    liked = Like.query.filter_by(post_id=post_id, user_id=user_id).count() == 1
+    return liked, db.session.get(Post, post_id).likes_count
+
+
+def test_clicks_are_coalesced_until_the_flush(app, buffer):
+    with app.app_context():
+        user_id = make_users(1)[0].id
+        post_id = make_post().id
+
+        assert buffer.toggle(post_id, user_id) == (True, 1)
+        assert buffer.toggle(post_id, user_id) == (False, 0)
+        assert buffer.toggle(post_id, user_id) == (True, 1)
+        assert stored(post_id, user_id) == (False, 0)
+
+    buffer.flush()
+    with app.app_context():
+        assert stored(post_id, user_id) == (True, 1)
+        assert buffer.pending_delta(post_id) == 0
+
+
+def test_flush_between_read_and_record_is_not_lost(app, buffer):
+    with app.app_context():
+        user_id = make_users(1)[0].id
+        post_id = make_post().id
+        assert buffer.toggle(post_id, user_id) == (True, 1)
+
+        # The unlike reads the stored state, then the like is flushed
+        # before the unlike is recorded
+        racing = FlushBeforeNextLock(buffer)
+        main = threading.current_thread()
+
+        def arm(*args):
+            if threading.current_thread() is main:
+                racing.armed = True
+
+        buffer._lock = racing
+        event.listen(db.engine, "after_cursor_execute", arm)
+        try:
+            assert buffer.toggle(post_id, user_id) == (False, 0)
+        finally:
+            event.remove(db.engine, "after_cursor_execute", arm)
+            buffer._lock = racing.lock
+
+    buffer.flush()
+    with app.app_context():
+        assert stored(post_id, user_id) == (False, 0)
+
+
+def test_toggle_during_a_flush_counts_its_likes_once(app, buffer):
+    with app.app_context():
+        first, second = (user.id for user in make_users(2))
+        post_id = make_post().id
+        assert buffer.toggle(post_id, first) == (True, 1)
+
+    # The flush has committed the first like but not yet dropped its delta
+    committed, release = threading.Event(), threading.Event()
+
+    def write_then_stall(intents):
+        type(buffer)._write(intents)
+        committed.set()
+        release.wait(5)
+
+    buffer._write = write_then_stall
+    flusher = threading.Thread(target=buffer.flush)
+    flusher.start()
+    result = []
+    try:
+        assert committed.wait(5)
+
+        def like():
+            with app.app_context():
+                result.append(buffer.toggle(post_id, second))
+
+        liker = threading.Thread(target=like)
+        liker.start()
+        time.sleep(0.1)
+        release.set()
+        liker.join(5)
+    finally:
+        release.set()
+        flusher.join(5)
+        del buffer._write
+
+    assert result == [(True, 2)]
+
+
+SIGTERM_SCRIPT = """
+import sys
+import time
+
+sys.path[:0] = {path!r}
+from app import create_app
+from config import Config
+from conftest import make_post, make_users
+from extensions import like_buffer
+
+
+class BufferedConfig(Config):
+    SQLALCHEMY_DATABASE_URI = {uri!r}
+    UPLOAD_FOLDER = {uploads!r}
+    LIKE_WRITE_BEHIND = True
+    LIKE_FLUSH_INTERVAL = 3600
+    NOTIFICATION_WORKER = False
+
+
+app = create_app(BufferedConfig)
+with app.app_context():
+    user_id = make_users(1, prefix="worker")[0].id
+    post_id = make_post().id
+    like_buffer.toggle(post_id, user_id)
+print("buffered", post_id, user_id, flush=True)
+time.sleep(60)
+"""
+
+
+def test_sigterm_flushes_buffered_likes(app):
+    tests = os.path.dirname(os.path.abspath(__file__))
+    script = SIGTERM_SCRIPT.format(
+        path=[os.path.dirname(tests), tests],
+        uri=app.config["SQLALCHEMY_DATABASE_URI"],
+        uploads=str(app.config["UPLOAD_FOLDER"]),
+    )
+    worker = subprocess.Popen(
+        [sys.executable, "-c", script], stdout=subprocess.PIPE, text=True
+    )
+    try:
+        for line in worker.stdout:
+            if line.startswith("buffered"):
+                post_id, user_id = map(int, line.split()[1:])
+                break
+        else:
+            pytest.fail("the worker exited before buffering a like")
+        worker.send_signal(signal.SIGTERM)
+        assert worker.wait(timeout=30) == 128 + signal.SIGTERM
+    finally:
+        worker.kill()
+        worker.stdout.close()
+
+    with app.app_context():
+        assert stored(post_id, user_id) == (True, 1)
@@ -0,0 +1,60 @@
+import threading
+
+from conftest import login, make_comment_tree, make_post, make_users
+from extensions import db
+
+
+def hammer(app, url, user_ids, toggles):
+    """Toggle url from one client per entry of user_ids, all at once"""
+    statuses = []
+    barrier = threading.Barrier(len(user_ids))
+
+    def run(user_id):
+        client = app.test_client()
+        login(client, user_id)
+        barrier.wait()
+        for _ in range(toggles):
+            statuses.append(client.post(url).status_code)
+
+    threads = [threading.Thread(target=run, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+
+def test_concurrent_post_likes_keep_the_counter_exact(app):
+    from models import Like, Post
+
+    with app.app_context():
+        users = make_users(16)
+        post_id = make_post().id
+        # Four clients of the same user double-click alongside everyone else
+        user_ids = [user.id for user in users] + [users[0].id] * 4
+
+    statuses = hammer(app, f"/post/{post_id}/like", user_ids, toggles=5)
+
+    assert statuses.count(200) == len(user_ids) * 5
+    with app.app_context():
+        stored = db.session.get(Post, post_id).likes_count
+        assert stored == Like.query.filter_by(post_id=post_id).count()
+        # Every other user toggled an odd number of times
+        assert stored >= len(users) - 1
+
+
+def test_concurrent_comment_likes_keep_the_counter_exact(app):
+    from models import Comment, CommentLike
+
+    with app.app_context():
+        users = make_users(12)
+        post = make_post()
+        comment_id = make_comment_tree(post, users[:1], 1)[0].id
+        user_ids = [user.id for user in users] + [users[1].id] * 4
+
+    statuses = hammer(app, f"/comment/{comment_id}/like", user_ids, toggles=4)
+
+    assert statuses.count(200) == len(user_ids) * 4
+    with app.app_context():
+        stored = db.session.get(Comment, comment_id).likes_count
+        assert stored == CommentLike.query.filter_by(comment_id=comment_id).count()
@@ -0,0 +1,49 @@
+import os
+
+from conftest import QueryCounter, make_comment_tree, make_post, make_users
+from extensions import db, notification_worker
+
+
+def writes(statements):
+    return [
+        statement
+        for statement, _ in statements
+        if not statement.lstrip().upper().startswith("SELECT")
+    ]
+
+
+def test_empty_outbox_poll_only_reads(app):
+    with app.app_context(), QueryCounter() as counter:
+        assert notification_worker.drain() == 0
+
+    assert counter.count == 1
+    assert writes(counter.statements) == []
+
+
+def test_queued_events_are_claimed_and_delivered(app):
+    from models import Notification, NotificationEvent, NotificationType
+
+    with app.app_context():
+        users = make_users(2)
+        comment = make_comment_tree(make_post(), users[:1], 1)[0]
+        NotificationEvent.enqueue(NotificationType.LIKE, users[1].id, comment.post_id, comment.id)
+        db.session.commit()
+        author_id = users[0].id
+
+    assert notification_worker.drain() == 1
+    with app.app_context():
+        assert NotificationEvent.query.count() == 0
+        assert Notification.query.filter_by(user_id=author_id).count() == 1
+
+
+def test_thread_starts_with_the_first_request_not_with_the_app(app, client):
+    app.config["NOTIFICATION_WORKER"] = True
+    app.config["NOTIFICATION_POLL_INTERVAL"] = 3600
+    notification_worker.init_app(app)
+    notification_worker._thread_pid = None
+    try:
+        assert notification_worker._thread_pid is None
+        client.get("/")
+        assert notification_worker._thread_pid == os.getpid()
+    finally:
+        notification_worker.enabled = False
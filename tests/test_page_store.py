@@ -0,0 +1,34 @@
+import os
+import time
+
+from page_cache import FileSystemPageStore
+
+
+def page(body):
+    return {"deps": {}, "status": 200, "headers": {}, "body": body}
+
+
+def test_filesystem_store_keeps_at_most_size_pages(tmp_path):
+    store = FileSystemPageStore(str(tmp_path), ttl=60, size=4)
+    for i in range(10):
+        store.set(f"/?page={i}", page(str(i)))
+
+    assert len(os.listdir(tmp_path / "pages")) == 4
+    assert store.get("/?page=9")["body"] == "9"
+    assert store.get("/?page=0") is None
+
+
+def test_filesystem_store_sweeps_expired_pages_and_stale_temp_files(tmp_path):
+    store = FileSystemPageStore(str(tmp_path), ttl=60, size=100)
+    store.set("/old", page("old"))
+    stale = tmp_path / "pages" / ".tmpkilled"
+    stale.write_text("partial")
+    long_ago = time.time() - 120
+    for name in os.listdir(tmp_path / "pages"):
+        os.utime(tmp_path / "pages" / name, (long_ago, long_ago))
+    store.set("/new", page("new"))
+
+    store.sweep()
+
+    assert len(os.listdir(tmp_path / "pages")) == 1
+    assert store.get("/new")["body"] == "new"
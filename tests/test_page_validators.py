@@ -0,0 +1,51 @@
+from conftest import QueryCounter, make_post
+from extensions import db
+
+
+def revalidate(app, client, url):
+    """Status and SQL statements of a conditional GET with the page's own ETag"""
+    etag = client.get(url).headers["ETag"]
+    with app.app_context(), QueryCounter() as counter:
+        status = client.get(url, headers={"If-None-Match": etag}).status_code
+    return status, [statement for statement, _ in counter.statements]
+
+
+def add_posts(app, count, start=0):
+    from models import Post
+
+    with app.app_context():
+        posts = [make_post(f"Post number {start + i}") for i in range(count)]
+        for post in posts:
+            Post.adjust_listing_counts(set(), post.listing_keys())
+        db.session.commit()
+        return [post.id for post in posts]
+
+
+def test_listing_revalidation_does_not_grow_with_the_archive(app, client):
+    add_posts(app, 8)
+    small_status, small = revalidate(app, client, "/")
+    add_posts(app, 80, start=8)
+    large_status, large = revalidate(app, client, "/")
+
+    assert small_status == large_status == 304
+    assert len(small) == len(large)
+    assert not any("sum(" in statement or "max(" in statement for statement in large)
+
+
+def test_listing_etag_follows_only_the_rows_on_the_page(app, client):
+    from models import Post
+
+    post_ids = add_posts(app, 10)
+    etag = client.get("/").headers["ETag"]
+
+    # The oldest post is on page 2
+    with app.app_context():
+        Post.adjust_counters(post_ids[0], likes=1)
+        db.session.commit()
+    assert client.get("/", headers={"If-None-Match": etag}).status_code == 304
+
+    # The newest post is on page 1
+    with app.app_context():
+        Post.adjust_counters(post_ids[-1], likes=1)
+        db.session.commit()
+    assert client.get("/", headers={"If-None-Match": etag}).status_code == 200
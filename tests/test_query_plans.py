@@ -0,0 +1,194 @@
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import QueryCounter, login, make_comment_tree, make_post, make_users
+from extensions import db
+
+# Every SCAN step walks a whole table or index: "SCAN posts", and also
+# "SCAN posts USING [COVERING] INDEX ...", which only avoids a sort. A
+# SEARCH step seeks through an index instead
+FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(\w+)")
+
+# Categories and tags are read whole, by design, for the cached taxonomy
+WHOLE_TABLE_READS = {"categories", "tags"}
+
+
+@pytest.fixture
+def site(app):
+    """A small site: posts in a category and a tag, comments, likes, an inbox"""
+    from models import Category, Like, Notification, Tag
+
+    with app.app_context():
+        users = make_users(4)
+        category = Category(name="Science")
+        tag = Tag(name="physics")
+        db.session.add_all([category, tag])
+        db.session.commit()
+        posts = [
+            make_post(f"Post number {i}", category=category, tags=[tag] if i % 2 else [])
+            for i in range(20)
+        ]
+        comments = make_comment_tree(posts[0], users, 40)
+        db.session.add_all(Like(post_id=post.id, user_id=users[0].id) for post in posts[:5])
+        start = datetime(2024, 1, 1)
+        db.session.execute(
+            db.insert(Notification),
+            [
+                {
+                    "user_id": users[0].id,
+                    "type": "like",
+                    "message": "liked your comment",
+                    "from_user_id": users[1].id,
+                    "post_id": posts[0].id,
+                    "comment_id": comments[i].id,
+                    "is_read": i % 3 == 0,
+                    "created_at": start + timedelta(minutes=i),
+                }
+                for i in range(30)
+            ],
+        )
+        db.session.commit()
+        return {
+            "user_id": users[0].id,
+            "category_id": category.id,
+            "tag_id": tag.id,
+            "post_id": posts[0].id,
+            "slug": posts[0].slug,
+            "post_ids": [post.id for post in posts],
+            "comment_id": next(c.id for c in comments if c.parent_comment_id is None),
+        }
+
+
+def full_scans(statements):
+    """Tables read by a full scan in the plans of the captured SELECTs"""
+    scanned = set()
+    connection = db.session.connection()
+    for statement, parameters in statements:
+        if not statement.lstrip().upper().startswith("SELECT"):
+            continue
+        plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        for row in plan:
+            match = FULL_SCAN.match(row[3])
+            if match:
+                scanned.add((match.group(1), statement))
+    return scanned
+
+
+URLS = [
+    "/",
+    "/?page=2",
+    "/?cursor={cursor}",
+    "/category/{category_id}",
+    "/tag/{tag_id}",
+    "/post/{slug}",
+    "/api/post/{post_id}/comments",
+    "/api/post/{post_id}/comments?limit=5",
+    "/api/comment/{comment_id}/replies",
+    "/api/likes/state?post_ids={post_ids}",
+    "/api/notifications",
+    "/api/notifications?unread=1&limit=5",
+    "/api/notifications/unread-count",
+]
+
+
+@pytest.mark.parametrize("url", URLS)
+def test_hot_query_does_not_scan_a_table(app, client, site, url):
+    from models import Post
+    from utils import encode_cursor
+
+    login(client, site["user_id"])
+    with app.app_context():
+        middle = db.session.get(Post, site["post_ids"][10])
+        url = url.format(
+            cursor=encode_cursor(middle.created_at, middle.id),
+            category_id=site["category_id"],
+            tag_id=site["tag_id"],
+            slug=site["slug"],
+            post_id=site["post_id"],
+            comment_id=site["comment_id"],
+            post_ids=",".join(str(post_id) for post_id in site["post_ids"]),
+        )
+
+        with QueryCounter() as counter:
+            response = client.get(url)
+        assert response.status_code == 200
+        assert counter.count
+
+        scanned = {
+            (table, statement)
+            for table, statement in full_scans(counter.statements)
+            if table not in WHOLE_TABLE_READS
+        }
+    assert not scanned, f"{url} scans: " + "\n".join(
+        f"{table}: {statement}" for table, statement in scanned
+    )
+
+
+@pytest.mark.parametrize(
+    "statement, parameters",
+    [
+        ("SELECT id FROM posts WHERE title = ?", ("Post number 3",)),
+        ("SELECT id FROM posts WHERE title = ? ORDER BY created_at", ("Post number 3",)),
+        ("SELECT count(id) FROM posts", ()),
+    ],
+)
+def test_detects_a_full_scan(app, site, statement, parameters):
+    with app.app_context():
+        assert full_scans([(statement, parameters)]) == {("posts", statement)}
+
+
+def test_recount_finds_children_through_an_index(app, site):
+    from models import recount_counters
+
+    with app.app_context():
+        with QueryCounter() as counter:
+            recount_counters()
+        connection = db.session.connection()
+        scanned = set()
+        for statement, parameters in counter.statements:
+            updated = re.match(r"\s*UPDATE (\w+)", statement)
+            if not updated:
+                continue
+            plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            for row in plan:
+                # The updated table itself is walked once; each child count
+                # must be an index lookup, not a scan per row
+                match = FULL_SCAN.match(row[3])
+                if match and match.group(1) != updated.group(1):
+                    scanned.add((match.group(1), row[3]))
+    assert not scanned
+
+
+@pytest.mark.parametrize("unread_only", [False, True])
+def test_inbox_is_read_in_index_order(app, site, unread_only):
+    from models import Notification
+
+    with app.app_context():
+        with QueryCounter() as counter:
+            Notification.inbox_page(site["user_id"], limit=5, unread_only=unread_only)
+        connection = db.session.connection()
+        statement, parameters = counter.statements[-1]
+        plan = [
+            row[3]
+            for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        ]
+    assert not [step for step in plan if "TEMP B-TREE" in step], plan
+
+
+def test_startup_adds_indexes_missing_from_an_existing_database(app):
+    from app import create_app
+
+    with app.app_context():
+        db.session.execute(db.text("DROP INDEX ix_notifications_user_created"))
+        db.session.commit()
+        db.session.remove()
+        db.engine.dispose()
+
+    # Restart on the same database
+    restarted = create_app(type("RestartConfig", (), dict(app.config)))
+    with restarted.app_context():
+        indexes = db.inspect(db.engine).get_indexes("notifications")
+        db.engine.dispose()
+    assert "ix_notifications_user_created" in {index["name"] for index in indexes}
@@ -0,0 +1,82 @@
+import time
+
+from conftest import make_post
+from extensions import db
+from search import suggestions
+
+
+def suggested(client, prefix):
+    data = client.get(f"/api/search/suggest?q={prefix}").get_json()
+    return [item["label"] for item in data["suggestions"]]
+
+
+def rename_on_another_worker(app, post_id, title):
+    """What an admin edit on another worker leaves behind: this worker's
+    index is not told, only the shared change log moves"""
+    from models import Post, SuggestionChange
+
+    with app.app_context():
+        post = db.session.get(Post, post_id)
+        post.title = title
+        db.session.add(SuggestionChange(kind="post", item_id=post_id, label=title, slug=post.slug))
+        db.session.commit()
+
+
+def test_rename_on_another_worker_is_applied_without_a_rebuild(app, client):
+    with app.app_context():
+        post_id = make_post("Tuning SQLite").id
+    suggestions.poll = 0.05
+    assert suggested(client, "sql") == ["Tuning SQLite"]
+    loads, applied = suggestions.loads, suggestions.changes_applied
+
+    rename_on_another_worker(app, post_id, "Tuning Postgres")
+    assert suggested(client, "post") == []
+    time.sleep(0.06)
+
+    assert suggested(client, "sql") == []
+    assert suggested(client, "post") == ["Tuning Postgres"]
+    assert suggestions.loads == loads
+    assert suggestions.changes_applied == applied + 1
+
+
+def test_local_touch_is_seen_without_waiting_for_the_poll(app, client):
+    from search import touch_post_suggestion
+
+    suggestions.poll = 3600
+    assert suggested(client, "new") == []
+    with app.app_context():
+        touch_post_suggestion(make_post("New things"))
+        db.session.commit()
+
+    assert suggested(client, "new") == ["New things"]
+
+
+def test_trimmed_changes_trigger_a_rebuild(app, client):
+    from search import touch_suggestions
+
+    with app.app_context():
+        post_id = make_post("Tuning SQLite").id
+    suggestions.poll = 0.05
+    assert suggested(client, "tun") == ["Tuning SQLite"]
+    loads = suggestions.loads
+
+    # More changes than the log keeps, from another worker
+    suggestions.log_size = 2
+    for i in range(3):
+        rename_on_another_worker(app, post_id, f"Tuning round {i}")
+    with app.app_context():
+        touch_suggestions("tag", 999)
+        db.session.commit()
+
+    assert suggested(client, "tun") == ["Tuning round 2"]
+    assert suggestions.loads == loads + 1
+
+
+def test_refresh_in_progress_does_not_block_lookups(app, client):
+    with app.app_context():
+        make_post("Tuning SQLite")
+    assert suggested(client, "tun") == ["Tuning SQLite"]
+
+    suggestions.expire()
+    with suggestions._refresh_lock:
+        assert suggested(client, "tun") == ["Tuning SQLite"]
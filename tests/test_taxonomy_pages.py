@@ -0,0 +1,79 @@
+import pytest
+
+from conftest import make_post
+from extensions import db, page_cache
+
+
+@pytest.fixture
+def site(app):
+    """Two published posts and a category, with the page cache on"""
+    from models import Category, Post
+
+    app.config["PAGE_CACHE_TTL"] = 60
+    page_cache.init_app(app)
+    with app.app_context():
+        category = Category(name="Science")
+        db.session.add(category)
+        db.session.commit()
+        posts = [make_post("Plain post"), make_post("Science post", category=category)]
+        for post in posts:
+            Post.adjust_listing_counts(set(), post.listing_keys())
+        db.session.commit()
+        return {"category_id": category.id, "slug": posts[0].slug}
+
+
+def publish_in_category(app, category_id):
+    """What the admin routes do when a post joins a category"""
+    from models import Category, Post
+
+    with app.app_context():
+        post = make_post("Another science post", published=False)
+        post.is_published = True
+        post.category = db.session.get(Category, category_id)
+        post.invalidate_pages()
+        Post.adjust_listing_counts(set(), post.listing_keys())
+        db.session.commit()
+
+
+def test_count_change_keeps_unrelated_post_pages(app, client, site):
+    url = f"/post/{site['slug']}"
+    first = client.get(url)
+    assert first.headers["X-Page-Cache"] == "MISS"
+
+    publish_in_category(app, site["category_id"])
+
+    cached = client.get(url)
+    assert cached.headers["X-Page-Cache"] == "HIT"
+    assert client.get(url, headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+    # Bypassing the page cache, the validators still match
+    client.set_cookie("session", "x")
+    assert client.get(url, headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+
+def test_count_change_refreshes_the_index_sidebar(app, client, site):
+    first = client.get("/")
+    assert first.headers["X-Page-Cache"] == "MISS"
+
+    publish_in_category(app, site["category_id"])
+
+    fresh = client.get("/")
+    assert fresh.headers["X-Page-Cache"] == "MISS"
+    assert fresh.headers["ETag"] != first.headers["ETag"]
+    assert b'<span class="badge bg-light text-muted ms-auto">2</span>' in fresh.data
+
+
+def test_new_category_refreshes_every_page(app, client, site):
+    from models import Category, touch_taxonomy
+
+    url = f"/post/{site['slug']}"
+    first = client.get(url)
+
+    with app.app_context():
+        db.session.add(Category(name="History"))
+        touch_taxonomy()
+        db.session.commit()
+
+    fresh = client.get(url)
+    assert fresh.headers["X-Page-Cache"] == "MISS"
+    assert fresh.headers["ETag"] != first.headers["ETag"]
+    assert b"History" in fresh.data
@@ -1,7 +1,17 @@
 from slugify import slugify
 from bleach import clean, linkify
-from flask import request, session
+from flask import request, session, current_app
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
 from datetime import datetime, timedelta
+from functools import wraps
+import base64
+import hashlib
+import html
+import os
+import re
+import threading
+import time
 import uuid
 
 def generate_slug(title):
@@ -15,6 +25,21 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
+def remove_files_in_background(paths):
+    """Delete files on a daemon thread so the request does not wait on the disk"""
+    paths = [path for path in paths if path]
+    if not paths:
+        return
+
+    def remove():
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    threading.Thread(target=remove, daemon=True).start()
+
 def is_image_file(filename):
     """Check if file is an image"""
     from config import Config
@@ -42,6 +67,13 @@ def sanitize_html(content):
     cleaned = linkify(cleaned)
     return cleaned
 
+def html_to_text(content):
+    """Strip markup from HTML content and collapse it to plain text"""
+    if not content:
+        return ""
+    text = clean(content, tags=[], strip=True)
+    return re.sub(r"\s+", " ", html.unescape(text)).strip()
+
 def get_user_identifier():
     """Get unique identifier for user (IP + session)"""
     if 'user_id' not in session:
@@ -103,3 +135,104 @@ def get_avatar_initials(name):
     return name[0].upper() if name else "?"
 
 
+
+def encode_cursor(created_at, item_id):
+    """Encode a (created_at, id) keyset position as an opaque URL-safe token"""
+    raw = f"{created_at.isoformat()}|{item_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(token):
+    """Decode a cursor token back to (created_at, id); None if it is invalid"""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        created_at, item_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (ValueError, UnicodeError):
+        return None
+
+def make_etag(*parts):
+    """Build a strong ETag value from everything that determines a response"""
+    raw = "|".join(str(part) for part in parts).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()[:24]
+
+def not_modified(etag):
+    """Return a 304 response if the client already holds etag, else None"""
+    if etag not in request.if_none_match:
+        return None
+    response = current_app.response_class(status=304)
+    return with_etag(response, etag)
+
+def with_etag(response, etag):
+    """Attach etag plus the headers that make clients revalidate it every time"""
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Cookie")
+    return response
+
+def with_page_validators(response, etag):
+    """
+    Validators and caching headers for an HTML page. Anonymous pages may be
+    kept by a shared cache (reverse proxy) for PROXY_CACHE_MAX_AGE seconds;
+    browsers, and everyone signed in, revalidate on every request.
+    """
+    response.set_etag(etag)
+    if current_user.is_authenticated:
+        response.headers["Cache-Control"] = "private, no-cache"
+    else:
+        max_age = current_app.config.get("PROXY_CACHE_MAX_AGE", 0)
+        response.headers["Cache-Control"] = f"public, max-age=0, s-maxage={max_age}"
+    response.vary.add("Cookie")
+    return response
+
+def csrf_window():
+    """
+    What the CSRF tokens in a signed-in page depend on: the session's CSRF
+    secret and the current half of WTF_CSRF_TIME_LIMIT. A page revalidated
+    within the same half was rendered less than half a token lifetime ago,
+    so its tokens stay valid for at least the other half.
+    """
+    # Creates the secret on a first visit, so the first ETag already holds
+    generate_csrf()
+    secret = session.get(current_app.config.get("WTF_CSRF_FIELD_NAME", "csrf_token"))
+    limit = current_app.config.get("WTF_CSRF_TIME_LIMIT", 3600)
+    return secret, int(time.time() // (limit / 2)) if limit else None
+
+def conditional_page(validators):
+    """
+    Decorator for HTML views. validators(**view_kwargs) runs a few cheap
+    queries and returns the ETag parts, or None to let the view answer
+    (e.g. with a 404). A client that already holds the page gets a 304 before
+    the view runs or any template is rendered. Pages rendered with pending
+    flash messages get no validators, so they are never answered with 304.
+
+    There is no Last-Modified: like and comment activity changes a page
+    without moving any timestamp, so only the ETag can tell.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if session.get("_flashes"):
+                return view(*args, **kwargs)
+
+            parts = validators(**kwargs)
+            if parts is None:
+                return view(*args, **kwargs)
+
+            if current_user.is_authenticated:
+                # Signed-in pages embed CSRF tokens, which expire
+                etag = make_etag("page", request.full_path, current_user.id, *csrf_window(), *parts)
+            else:
+                etag = make_etag("page", request.full_path, None, *parts)
+
+            if etag in request.if_none_match:
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            return with_page_validators(response, etag)
+        return wrapper
+    return decorator